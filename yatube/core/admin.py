@@ -0,0 +1,13 @@
+from django.contrib import admin
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    """Очередь фоновых задач: упавшие задачи видны с текстом ошибки."""
+    list_display = ('pk', 'name', 'status', 'attempts', 'run_at', 'key')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'key')
+    readonly_fields = ('last_error',)
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,239 @@
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.views.decorators.http import condition
+
+# Поколение кэша страниц, которое меняется при любом изменении контента.
+PAGES_GENERATION = 'pages'
+
+# Метка персональной части страницы в закэшированной разметке.
+HOLE_MARKER = '<!--donut:{}-->'
+HOLE_PATTERN = re.compile(r'<!--donut:([A-Za-z0-9_\-=]+)-->')
+
+# Сколько живет блокировка пересчета и сколько ее ждут другие запросы.
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 2
+LOCK_POLL_INTERVAL = 0.05
+
+# Коэффициент вероятностного раннего обновления (XFetch).
+EARLY_REFRESH_BETA = 1.0
+
+
+def _generation_key(name):
+    return f'generation:{name}'
+
+
+def get_generation(name=PAGES_GENERATION):
+    """
+    Возвращает текущее поколение кэша. Если счетчик вытеснен
+    из кэша, новое поколение берется от текущего времени в мс,
+    чтобы не совпасть ни с одним из уже выданных ранее.
+    """
+    key = _generation_key(name)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, int(time.time() * 1000), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(name=PAGES_GENERATION):
+    """
+    Переводит кэш на новое поколение: старые ключи больше не читаются.
+    Время смены поколения служит заголовком Last-Modified.
+    """
+    key = _generation_key(name)
+    cache.set(f'{key}.at', time.time(), None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        get_generation(name)
+        return cache.incr(key)
+
+
+def _generation_names(names, request):
+    return [name(request) if callable(name) else name for name in names]
+
+
+def generation_condition(*names):
+    """
+    Валидаторы условного GET (ETag и Last-Modified) по поколениям кэша.
+    Считаются без рендера и без запросов к базе, поэтому повторный
+    запрос браузера или прокси получает 304, пока контент не менялся.
+    Имя поколения может быть функцией от request, например для
+    ленты конкретного пользователя. В ETag входят пользователь
+    и CSRF-cookie, потому что от них зависит персональная часть.
+    """
+    names = names or (PAGES_GENERATION,)
+
+    def etag(request, *args, **kwargs):
+        parts = [
+            str(get_generation(name))
+            for name in _generation_names(names, request)
+        ]
+        parts += [
+            str(request.user.pk),
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+            request.get_full_path(),
+        ]
+        return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        changed = cache.get_many([
+            f'{_generation_key(name)}.at'
+            for name in _generation_names(names, request)
+        ])
+        if not changed:
+            return None
+        return datetime.fromtimestamp(max(changed.values()), timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+class Uncacheable(Exception):
+    """Результат вычисления нельзя класть в кэш, его отдают как есть."""
+
+    def __init__(self, value):
+        super().__init__(value)
+        self.value = value
+
+
+def _compute_and_store(key, compute, timeout, stale_timeout):
+    started = time.time()
+    value = compute()
+    delta = time.time() - started
+    cache.set(
+        key, (value, time.time() + timeout, delta), timeout + stale_timeout
+    )
+    return value
+
+
+def get_or_compute(key, compute, timeout, stale_timeout=0,
+                   beta=EARLY_REFRESH_BETA):
+    """
+    Значение из кэша с защитой от «стада» одновременных пересчетов.
+
+    - Пересчитывает только тот запрос, который взял блокировку
+      в кэше (cache.add), остальные ждут готового значения.
+    - Незадолго до истечения срока значение обновляется заранее
+      с вероятностью, растущей к концу срока и пропорциональной
+      времени вычисления (XFetch).
+    - Еще stale_timeout секунд после срока устаревшее значение
+      отдается, пока другой запрос его пересчитывает.
+
+    Блокировка надежна, только если add() кэша атомарен (LocMem
+    в одном процессе, memcached, redis); с FileBased она лишь
+    снижает число одновременных пересчетов.
+    """
+    entry = cache.get(key)
+    lock_key = f'{key}.lock'
+    if entry is not None:
+        value, expires_at, delta = entry
+        jitter = delta * beta * math.log(1 - random.random())
+        if time.time() - jitter < expires_at:
+            return value
+        if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            return value
+        try:
+            return _compute_and_store(key, compute, timeout, stale_timeout)
+        finally:
+            cache.delete(lock_key)
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            return _compute_and_store(key, compute, timeout, stale_timeout)
+        finally:
+            cache.delete(lock_key)
+    deadline = time.time() + LOCK_WAIT
+    while time.time() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return compute()
+
+
+def _donut_key(key_prefix, generation, request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'{key_prefix}.{get_generation(generation)}.{path}'
+
+
+def make_hole(template_name, context):
+    """
+    Метка на месте персональной части страницы. В метке хранится
+    шаблон и его простой контекст, чтобы дорисовать ее из кэша.
+    """
+    payload = json.dumps([template_name, context]).encode()
+    return HOLE_MARKER.format(base64.urlsafe_b64encode(payload).decode())
+
+
+def render_hole(template_name, context, request):
+    return render_to_string(template_name, context, request=request)
+
+
+def fill_holes(content, request):
+    """Заменяет метки в общей части страницы на разметку для request."""
+    def replace(match):
+        template_name, context = json.loads(
+            base64.urlsafe_b64decode(match.group(1))
+        )
+        return render_hole(template_name, context, request)
+    return HOLE_PATTERN.sub(replace, content)
+
+
+def donut_cache_page(timeout, key_prefix, generation=PAGES_GENERATION,
+                     stale_timeout=60 * 10):
+    """
+    Кэширование страницы «с дыркой»: общая для всех часть страницы
+    хранится в кэше один раз, а шапка, переключатель и другие
+    персональные части, размеченные тегом {% donut %},
+    дорисовываются для каждого запроса. Поэтому кэш одинаково
+    работает и для гостей, и для авторизованных пользователей.
+    В ключ входит поколение кэша: после изменения контента
+    страница соберется заново. Пересчет защищен get_or_compute.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            rendered = {}
+
+            def compute():
+                request.donut_holes = True
+                try:
+                    response = view(request, *args, **kwargs)
+                finally:
+                    request.donut_holes = False
+                if response.status_code != 200 or response.streaming:
+                    raise Uncacheable(response)
+                rendered['response'] = response
+                content = response.content.decode(response.charset)
+                return content, response['Content-Type']
+
+            try:
+                content, content_type = get_or_compute(
+                    _donut_key(key_prefix, generation, request),
+                    compute, timeout, stale_timeout,
+                )
+            except Uncacheable as error:
+                return error.value
+            response = rendered.get('response')
+            if response is None:
+                return HttpResponse(
+                    fill_holes(content, request), content_type=content_type
+                )
+            response.content = fill_holes(content, request)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.tasks import prune_jobs
+
+
+class Command(BaseCommand):
+    help = 'Удаляет из очереди давно выполненные и упавшие задачи.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=settings.TASKS_FINISHED_TTL,
+            help='Возраст завершенной задачи в секундах.',
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_jobs(options['older_than'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено задач: {deleted}.'
+        ))
@@ -0,0 +1,71 @@
+import os
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.tasks import prune_jobs, release_stale_jobs, run_pending
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из очереди (core.tasks) '
+        'в нескольких потоках.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.TASKS_CONCURRENCY,
+            help='Сколько задач выполнять одновременно.',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=settings.TASKS_POLL_INTERVAL,
+            help='Пауза в секундах, когда очередь пуста.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти.',
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        released = release_stale_jobs()
+        if released:
+            self.stdout.write(f'Возвращено в очередь задач: {released}.')
+        pruned = prune_jobs()
+        if pruned:
+            self.stdout.write(f'Удалено завершенных задач: {pruned}.')
+        name = f'{socket.gethostname()}:{os.getpid()}'
+        threads = [
+            threading.Thread(
+                target=self.work,
+                args=(f'{name}:{number}', options),
+                daemon=True,
+            )
+            for number in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            self.stdout.write('Дожидаемся текущих задач...')
+            self.stopping.set()
+            for thread in threads:
+                thread.join()
+
+    def work(self, worker, options):
+        try:
+            while not self.stopping.is_set():
+                if run_pending(worker, limit=1):
+                    continue
+                if options['once']:
+                    return
+                self.stopping.wait(options['poll_interval'])
+        finally:
+            connection.close()
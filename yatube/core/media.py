@@ -0,0 +1,206 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.http import HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+# Имена, в которых есть хеш содержимого (миниатюры sorl и картинки
+# постов), никогда не меняют содержимое и кэшируются навсегда.
+HASHED_MEDIA_NAME = re.compile(r'(?:^|/)[0-9a-f]{32,64}\.\w+$')
+
+# Статика после collectstatic с ManifestStaticFilesStorage:
+# logo.0123456789ab.png.
+HASHED_STATIC_NAME = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MEDIA_CACHE_CONTROL = 'public, max-age=3600'
+
+# Заранее сжатые копии статики в порядке предпочтения.
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """
+    Часть открытого файла для ответа 206: читает не больше length
+    байт начиная с offset. fileno() нарочно нет, чтобы сервер
+    не отправил через sendfile файл целиком.
+    """
+
+    def __init__(self, file, offset, length):
+        self.file = file
+        self.remaining = length
+        file.seek(offset)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Разбирает заголовок Range с одним диапазоном байт.
+    Возвращает (начало, длина), None для неподдерживаемого
+    заголовка (отдается весь файл) или ValueError, если
+    диапазон за пределами файла.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        length = min(int(end), size)
+        if not length:
+            raise ValueError(header)
+        return size - length, length
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end - start + 1
+
+
+def _cache_control(path, hashed_pattern):
+    if hashed_pattern.search(path):
+        return IMMUTABLE_CACHE_CONTROL
+    return MEDIA_CACHE_CONTROL
+
+
+def _resolve(root, path):
+    """Путь к обычному файлу внутри root или Http404."""
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404('Файл не найден')
+    if not os.path.isfile(full_path):
+        raise Http404('Файл не найден')
+    return full_path
+
+
+def _accepted_encodings(request):
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    return {
+        token.split(';')[0].strip().lower() for token in header.split(',')
+    }
+
+
+def _precompressed(request, full_path):
+    """Сжатая копия файла, которую принимает клиент, и ее кодировка."""
+    accepted = _accepted_encodings(request)
+    for encoding, suffix in PRECOMPRESSED:
+        if encoding in accepted and os.path.isfile(full_path + suffix):
+            return full_path + suffix, encoding
+    return full_path, None
+
+
+def _offloaded_response(path, content_type):
+    """
+    Ответ без тела: файл отдает сам веб-сервер (nginx по
+    X-Accel-Redirect или Apache/lighttpd по X-Sendfile),
+    вместе с Range и sendfile.
+    """
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_ACCEL_REDIRECT:
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT + path
+    else:
+        response['X-Sendfile'] = safe_join(settings.MEDIA_ROOT, path)
+    return response
+
+
+def _file_response(request, full_path, stat, last_modified):
+    byte_range = None
+    header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if header and (not if_range or if_range == last_modified):
+        try:
+            byte_range = parse_range(header, stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file)
+    else:
+        start, length = byte_range
+        response = FileResponse(FileRange(file, start, length), status=206)
+        response['Content-Length'] = length
+        response['Content-Range'] = (
+            f'bytes {start}-{start + length - 1}/{stat.st_size}'
+        )
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _serve_file(request, root, path, hashed_pattern, offload=False,
+                precompressed=False):
+    full_path = _resolve(root, path)
+    content_type = (
+        mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    )
+    encoding = None
+    if precompressed:
+        full_path, encoding = _precompressed(request, full_path)
+    stat = os.stat(full_path)
+    last_modified = http_date(stat.st_mtime)
+    cache_control = _cache_control(path, hashed_pattern)
+    if not was_modified_since(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'),
+        stat.st_mtime, stat.st_size,
+    ):
+        response = HttpResponseNotModified()
+    elif offload:
+        response = _offloaded_response(path, content_type)
+    else:
+        response = _file_response(request, full_path, stat, last_modified)
+        if response.status_code == 416:
+            return response
+        response['Content-Type'] = content_type
+        if encoding:
+            response['Content-Encoding'] = encoding
+    if response.status_code != 304:
+        response['Last-Modified'] = last_modified
+    if precompressed:
+        response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def serve_media(request, path):
+    """
+    Отдает файл из MEDIA_ROOT, не читая его в память Python.
+    Целый файл уходит через FileResponse (и sendfile сервера через
+    wsgi.file_wrapper) или передается веб-серверу заголовком.
+    Поддерживаются условные запросы и Range с одним диапазоном.
+    """
+    return _serve_file(
+        request, settings.MEDIA_ROOT, path, HASHED_MEDIA_NAME,
+        offload=bool(
+            settings.MEDIA_ACCEL_REDIRECT or settings.MEDIA_SENDFILE
+        ),
+    )
+
+
+def serve_static(request, path):
+    """
+    Отдает собранную статику из STATIC_ROOT. Если клиент принимает
+    brotli или gzip, отдается заранее сжатая в collectstatic копия,
+    сжатия на запрос нет. Файлы с хешем в имени кэшируются навсегда.
+    """
+    return _serve_file(
+        request, settings.STATIC_ROOT, path, HASHED_STATIC_NAME,
+        precompressed=True,
+    )
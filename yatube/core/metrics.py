@@ -0,0 +1,300 @@
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.template.backends.django import DjangoTemplates
+from django.utils.crypto import constant_time_compare
+
+# Границы корзин гистограммы времени ответа, в секундах.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PREFIX = 'yatube'
+
+COUNTERS = {
+    'requests_total': 'Запросы по представлению и статусу.',
+    'db_queries_total': 'Запросы к базе данных.',
+    'db_query_seconds_total': 'Время запросов к базе данных.',
+    'cache_hits_total': 'Попадания в кэш.',
+    'cache_misses_total': 'Промахи кэша.',
+    'template_render_seconds_total': 'Время рендера шаблонов.',
+}
+
+_local = threading.local()
+# У каждого потока свой шард со счетчиками: поток пишет только в свой,
+# поэтому на горячем пути нет блокировок. /metrics складывает шарды.
+# Шард завершившегося потока вливается в _retired, чтобы при потоке
+# на запрос (runserver) шарды не копились.
+_shards = set()
+_shards_lock = threading.Lock()
+_MISSING = object()
+
+
+class _Shard:
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            # Счетчики корзин (последняя - +Inf), сумма, количество.
+            histogram = self.histograms[key] = [0] * (len(BUCKETS) + 3)
+        histogram[bisect_left(BUCKETS, value)] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+    def merge(self, other):
+        for key, value in dict(other.counters).items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, values in dict(other.histograms).items():
+            values = list(values)
+            total = self.histograms.setdefault(key, [0] * len(values))
+            for position, value in enumerate(values):
+                total[position] += value
+
+
+_retired = _Shard()
+
+
+class _ShardOwner:
+    """
+    Метка потока в threading.local. Когда поток завершается,
+    метка удаляется вместе с его локальными данными, и weakref.finalize
+    вливает шард потока в общий _retired.
+    """
+
+
+def _retire(shard):
+    with _shards_lock:
+        _shards.discard(shard)
+        _retired.merge(shard)
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = _Shard()
+        _local.owner = _ShardOwner()
+        weakref.finalize(_local.owner, _retire, shard)
+        with _shards_lock:
+            _shards.add(shard)
+    return shard
+
+
+class RequestStats:
+    """Стоимость одного запроса: база, кэш и шаблоны."""
+
+    def __init__(self, request=None):
+        self.request = request
+        self.queries = 0
+        self.query_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_time += time.perf_counter() - started
+
+
+def current_stats():
+    """Статистика текущего запроса или None вне запроса."""
+    return getattr(_local, 'stats', None)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name
+
+
+class MetricsMiddleware:
+    """
+    Собирает для каждого запроса время ответа (гистограмма по имени
+    URL), число и время запросов к базе, попадания и промахи кэша
+    и время рендера шаблонов.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = _local.stats = RequestStats(request)
+        # Обертка снимается по себе, а не с конца списка: соединение
+        # может открыться посреди запроса, и тогда connection_created
+        # добавит в список свои обертки (core.querylog).
+        wrapper = stats.execute
+        connection.execute_wrappers.append(wrapper)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            connection.execute_wrappers.remove(wrapper)
+            _local.stats = None
+        duration = time.perf_counter() - started
+        view = (('view', view_name(request)),)
+        shard = _shard()
+        shard.observe('request_duration_seconds', view, duration)
+        shard.inc(
+            'requests_total', view + (('status', response.status_code),)
+        )
+        shard.inc('db_queries_total', view, stats.queries)
+        shard.inc('db_query_seconds_total', view, stats.query_time)
+        shard.inc('cache_hits_total', view, stats.cache_hits)
+        shard.inc('cache_misses_total', view, stats.cache_misses)
+        shard.inc('template_render_seconds_total', view, stats.template_time)
+        return response
+
+
+class MeteredCacheMixin:
+    """
+    Считает попадания и промахи кэша для текущего запроса. LocMem
+    и FileBased не переопределяют get_many: он вызывает get
+    для каждого ключа и считается здесь же.
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        stats = current_stats()
+        if value is _MISSING:
+            if stats is not None:
+                stats.cache_misses += 1
+            return default
+        if stats is not None:
+            stats.cache_hits += 1
+        return value
+
+
+class MeteredLocMemCache(MeteredCacheMixin, LocMemCache):
+    pass
+
+
+class MeteredFileBasedCache(MeteredCacheMixin, FileBasedCache):
+    pass
+
+
+class MeteredTemplate:
+    """
+    Обертка шаблона, которая засекает время рендера. Вложенные
+    рендеры (фрагменты внутри страницы) не считаются второй раз.
+    """
+
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+
+    def render(self, context=None, request=None):
+        stats = current_stats()
+        if stats is None:
+            return self._template.render(context, request)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - started
+
+
+class MeteredDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django с замером времени рендера."""
+
+    def from_string(self, template_code):
+        return MeteredTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return MeteredTemplate(super().get_template(template_name))
+
+
+def collect():
+    """Складывает шарды всех потоков: (счетчики, гистограммы)."""
+    total = _Shard()
+    with _shards_lock:
+        total.merge(_retired)
+        shards = list(_shards)
+    for shard in shards:
+        total.merge(shard)
+    return total.counters, total.histograms
+
+
+def _labels(labels, extra=()):
+    pairs = [
+        '{}="{}"'.format(
+            name, str(value).replace('\\', r'\\').replace('"', r'\"')
+        )
+        for name, value in labels + extra
+    ]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render_metrics():
+    """Метрики процесса в текстовом формате Prometheus."""
+    counters, histograms = collect()
+    lines = [
+        f'# HELP {PREFIX}_request_duration_seconds Время ответа.',
+        f'# TYPE {PREFIX}_request_duration_seconds histogram',
+    ]
+    name = f'{PREFIX}_request_duration_seconds'
+    for (_, labels), values in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), values):
+            cumulative += count
+            lines.append(
+                f'{name}_bucket{_labels(labels, (("le", bound),))} '
+                f'{cumulative}'
+            )
+        lines.append(f'{name}_sum{_labels(labels)} {values[-2]}')
+        lines.append(f'{name}_count{_labels(labels)} {values[-1]}')
+    for counter, help_text in COUNTERS.items():
+        lines.append(f'# HELP {PREFIX}_{counter} {help_text}')
+        lines.append(f'# TYPE {PREFIX}_{counter} counter')
+        for (name, labels), value in sorted(counters.items()):
+            if name == counter:
+                lines.append(f'{PREFIX}_{name}{_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def _allowed(request):
+    if not settings.METRICS_ENABLED:
+        return False
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return False
+    token = settings.METRICS_TOKEN
+    if not token:
+        return True
+    return constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+    )
+
+
+def metrics(request):
+    """
+    Метрики для Prometheus. Доступны, только если METRICS_ENABLED,
+    с адресов METRICS_ALLOWED_IPS и, если задан METRICS_TOKEN,
+    с этим токеном; каждый процесс отдает свои.
+    """
+    if not _allowed(request):
+        raise Http404
+    return HttpResponse(
+        render_metrics(), content_type='text/plain; version=0.0.4'
+    )
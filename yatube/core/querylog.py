@@ -0,0 +1,143 @@
+import logging
+import sys
+import sysconfig
+import threading
+import time
+
+from django.conf import settings
+from django.template.base import Node
+
+from . import metrics
+from .metrics import current_stats, view_name
+
+logger = logging.getLogger(__name__)
+
+# Стандартная библиотека, установленные пакеты (и Django) и обертки
+# запросов не считаются источником запроса.
+SKIPPED_PATHS = tuple({
+    sysconfig.get_paths()[name] for name in ('stdlib', 'purelib', 'platlib')
+}) + (__file__, metrics.__file__)
+
+RENDER_CODE = Node.render_annotated.__code__
+
+# Сколько разных запросов помнит ограничитель EXPLAIN.
+EXPLAIN_MEMORY = 1000
+
+_explained = {}
+_explained_lock = threading.Lock()
+
+
+def _origin():
+    """
+    Откуда пришел запрос: строка кода приложения и, если запрос
+    выполнился при рендере, шаблон и строка тега в нем.
+    """
+    code = template = None
+    frame = sys._getframe(2)
+    while frame is not None and (code is None or template is None):
+        if template is None and frame.f_code is RENDER_CODE:
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                template = (
+                    f'{origin.template_name or origin.name}:{token.lineno}'
+                )
+        filename = frame.f_code.co_filename
+        if code is None and not filename.startswith(SKIPPED_PATHS):
+            code = (
+                f'{filename}:{frame.f_lineno} in {frame.f_code.co_name}'
+            )
+        frame = frame.f_back
+    return code, template
+
+
+def _should_explain(sql):
+    """
+    Ограничитель EXPLAIN: один и тот же запрос разбирается не чаще
+    раза в SLOW_QUERY_EXPLAIN_INTERVAL секунд.
+    """
+    now = time.monotonic()
+    with _explained_lock:
+        last = _explained.get(sql)
+        if last is not None and (
+            now - last < settings.SLOW_QUERY_EXPLAIN_INTERVAL
+        ):
+            return False
+        if len(_explained) >= EXPLAIN_MEMORY:
+            _explained.clear()
+        _explained[sql] = now
+    return True
+
+
+def explain(connection, sql, params):
+    """
+    План запроса SQLite (EXPLAIN QUERY PLAN). Курсор берется
+    напрямую у драйвера, чтобы не задеть результаты исходного
+    запроса и не пройти через execute_wrapper еще раз.
+    """
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def _plan(connection, sql, params, many):
+    if (
+        many or connection.vendor != 'sqlite'
+        or not sql.lstrip().upper().startswith('SELECT')
+        or not _should_explain(sql)
+    ):
+        return None
+    try:
+        return explain(connection, sql, params)
+    except Exception:
+        logger.exception('Не удалось получить план запроса')
+        return None
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    """
+    execute_wrapper: запросы дольше SLOW_QUERY_MS миллисекунд пишутся
+    в лог с параметрами, представлением, строкой кода и шаблона,
+    а для SQLite еще и с планом запроса.
+    """
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = (time.perf_counter() - started) * 1000
+    threshold = settings.SLOW_QUERY_MS
+    if threshold is None or duration < threshold:
+        return result
+    stats = current_stats()
+    request = getattr(stats, 'request', None)
+    code, template = _origin()
+    plan = _plan(context['connection'], sql, params, many)
+    logger.warning(
+        'Медленный запрос %.1f мс: %s; параметры: %r; представление: %s; '
+        'код: %s; шаблон: %s%s',
+        duration, sql, params,
+        view_name(request) if request is not None else '-',
+        code or '-', template or '-',
+        f'\nПлан:\n{plan}' if plan else '',
+        extra={
+            'duration': duration,
+            'sql': sql,
+            'params': params,
+            'plan': plan,
+        },
+    )
+    return result
+
+
+def install(sender, connection, **kwargs):
+    """
+    Подключает журнал медленных запросов к новому соединению.
+    Обертка ставится первой: обертки, добавленные на время запроса,
+    снимаются позже и не должны задеть ее.
+    """
+    if settings.SLOW_QUERY_MS is not None and (
+        log_slow_queries not in connection.execute_wrappers
+    ):
+        connection.execute_wrappers.insert(0, log_slow_queries)
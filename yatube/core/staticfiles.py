@@ -0,0 +1,74 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Сжимаем только текстовые форматы: картинки уже сжаты.
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.svg', '.ico', '.json', '.map', '.txt', '.xml',
+)
+
+# Файлы меньше этого размера не сжимаем: выигрыш меньше заголовков.
+MIN_COMPRESS_SIZE = 256
+
+
+def _gzip(data):
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Статика с хешем содержимого в имени (manifest) и заранее
+    сжатыми копиями .gz и, если установлен brotli, .br рядом
+    с каждым текстовым файлом. Все сжатие делается один раз
+    в collectstatic, а не на каждый запрос.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        # Файл может обрабатываться за несколько проходов,
+        # сжимаем его окончательное имя.
+        hashed_names = {}
+        for name, hashed_name, processed in super().post_process(
+            paths, dry_run, **options
+        ):
+            if hashed_name:
+                hashed_names[name] = hashed_name
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name, hashed_name in hashed_names.items():
+            for compressed_name in self.compress(hashed_name):
+                yield name, compressed_name, True
+
+    def compressors(self):
+        compressors = [('.gz', _gzip)]
+        if brotli is not None:
+            compressors.append(('.br', _brotli))
+        return compressors
+
+    def compress(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return
+        with self.open(name) as file:
+            data = file.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        for suffix, compress in self.compressors():
+            compressed = compress(data)
+            if len(compressed) >= len(data):
+                continue
+            compressed_name = name + suffix
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            self._save(compressed_name, ContentFile(compressed))
+            yield compressed_name
@@ -0,0 +1,56 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Вложенные каталоги по первым символам хеша: posts/ab/cd/abcd....png.
+SHARD_DEPTH = 2
+SHARD_WIDTH = 2
+
+HASHED_NAME = re.compile(
+    r'(?:^|/)' + r'[0-9a-f]{%d}/' % SHARD_WIDTH * SHARD_DEPTH
+    + r'[0-9a-f]{64}(?:\.\w+)?$'
+)
+
+
+def content_hash(content):
+    """SHA-256 содержимого файла, прочитанного по частям."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME.search(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, где имя файла - хеш его содержимого. Файлы раскладываются
+    по вложенным каталогам, чтобы ни в одном не было миллионов записей,
+    а одинаковые загрузки хранятся один раз: записи ссылаются
+    на один и тот же файл. Поэтому файл нельзя удалять, пока на него
+    ссылается хоть одна запись.
+    """
+
+    def hashed_name(self, name, digest):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        shards = [
+            digest[position * SHARD_WIDTH:(position + 1) * SHARD_WIDTH]
+            for position in range(SHARD_DEPTH)
+        ]
+        return '/'.join(
+            part for part in (directory, *shards, digest + extension) if part
+        )
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content_hash(content))
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
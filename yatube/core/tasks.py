@@ -0,0 +1,164 @@
+import json
+import logging
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Сколько задач воркер забирает из базы за один запрос.
+CLAIM_BATCH_SIZE = 20
+
+# Верхняя граница паузы между повторами.
+MAX_RETRY_DELAY = 60 * 60
+
+
+class Task:
+    """
+    Функция, которую можно выполнить в фоне: task.enqueue(*args)
+    записывает задачу в таблицу Job, а воркер (manage.py run_worker)
+    потом вызывает функцию. Аргументы должны сериализоваться в JSON.
+    """
+
+    def __init__(self, func, max_attempts=None):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__name__}'
+        self.max_attempts = max_attempts or settings.TASKS_MAX_ATTEMPTS
+
+    def __call__(self, *args):
+        return self.func(*args)
+
+    def enqueue(self, *args, key=None, delay=0):
+        """
+        Ставит задачу в очередь. Строка задачи пишется в той же
+        транзакции, что и изменения запроса, и видна воркеру сразу
+        после коммита. Задача не добавляется, пока задача с тем же
+        ключом key ждет или выполняется. При TASKS_EAGER задача
+        выполняется сразу.
+        """
+        if settings.TASKS_EAGER:
+            return self(*args)
+        job = Job(
+            name=self.name,
+            args=json.dumps(args),
+            key=key,
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+        if key is None:
+            job.save()
+            return None
+        try:
+            with transaction.atomic():
+                job.save()
+        except IntegrityError:
+            pass
+        return None
+
+
+def task(func=None, *, max_attempts=None):
+    """Декоратор, превращающий функцию в фоновую задачу."""
+    if func is None:
+        return lambda func: Task(func, max_attempts)
+    return Task(func, max_attempts)
+
+
+def retry_delay(attempt):
+    """Экспоненциальная пауза перед повтором со случайным разбросом."""
+    delay = min(settings.TASKS_RETRY_DELAY * 2 ** (attempt - 1),
+                MAX_RETRY_DELAY)
+    return delay * random.uniform(0.5, 1.5)
+
+
+def release_stale_jobs():
+    """Возвращает в очередь задачи упавших воркеров."""
+    expired = timezone.now() - timedelta(seconds=settings.TASKS_LOCK_TIMEOUT)
+    return Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=expired
+    ).update(status=Job.PENDING, locked_by='')
+
+
+def prune_jobs(older_than=None):
+    """
+    Удаляет выполненные и упавшие задачи, завершенные раньше
+    older_than секунд назад (по умолчанию TASKS_FINISHED_TTL).
+    Возвращает число удаленных задач.
+    """
+    if older_than is None:
+        older_than = settings.TASKS_FINISHED_TTL
+    expired = timezone.now() - timedelta(seconds=older_than)
+    deleted, _ = Job.objects.filter(
+        status__in=[Job.DONE, Job.FAILED], locked_at__lt=expired
+    ).delete()
+    return deleted
+
+
+def claim_job(worker):
+    """
+    Забирает одну готовую к выполнению задачу. Захват - условный
+    UPDATE по статусу, поэтому работает и в SQLite без SELECT FOR
+    UPDATE: из нескольких воркеров строку получит только один.
+    """
+    candidates = Job.objects.filter(
+        status=Job.PENDING, run_at__lte=timezone.now()
+    ).order_by('run_at', 'id').values_list('id', flat=True)
+    for job_id in candidates[:CLAIM_BATCH_SIZE]:
+        claimed = Job.objects.filter(
+            pk=job_id, status=Job.PENDING
+        ).update(
+            status=Job.RUNNING,
+            locked_at=timezone.now(),
+            locked_by=worker,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def run_job(job):
+    """Выполняет задачу; при ошибке планирует повтор или сдается."""
+    try:
+        import_string(job.name)(*json.loads(job.args))
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Задача %s #%s упала', job.name, job.pk)
+        if job.attempts < job.max_attempts:
+            job.status = Job.PENDING
+            job.run_at = timezone.now() + timedelta(
+                seconds=retry_delay(job.attempts)
+            )
+        else:
+            job.status = Job.FAILED
+        job.last_error = error
+        job.locked_by = ''
+        job.save(update_fields=[
+            'status', 'run_at', 'last_error', 'locked_by'
+        ])
+        return False
+    job.status = Job.DONE
+    job.locked_by = ''
+    job.save(update_fields=['status', 'locked_by'])
+    return True
+
+
+def run_pending(worker=None, limit=None):
+    """Выполняет готовые задачи по очереди. Возвращает их число."""
+    worker = worker or f'{socket.gethostname()}:inline'
+    done = 0
+    while limit is None or done < limit:
+        job = claim_job(worker)
+        if job is None:
+            break
+        run_job(job)
+        done += 1
+    return done
@@ -0,0 +1,20 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.cache import make_hole, render_hole
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def donut(context, template_name, **kwargs):
+    """
+    Персональная часть страницы. На страницах с donut_cache_page
+    выводит метку, которая заполняется при каждом запросе,
+    на остальных страницах сразу рендерит шаблон.
+    Аргументы тега должны быть простыми значениями (строки, числа).
+    """
+    request = context.get('request')
+    if getattr(request, 'donut_holes', False):
+        return mark_safe(make_hole(template_name, kwargs))
+    return render_hole(template_name, kwargs, request)
@@ -0,0 +1,69 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from core.cache import get_or_compute
+
+KEY = 'test:stampede'
+
+
+class GetOrComputeTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.compute = mock.Mock(return_value='новое')
+
+    def put(self, value, expires_in, delta=0.0):
+        cache.set(KEY, (value, time.time() + expires_in, delta), 60)
+
+    def test_fresh_value_is_not_recomputed(self):
+        """Свежее значение отдается из кэша без пересчета."""
+        self.put('старое', 60)
+        self.assertEqual(get_or_compute(KEY, self.compute, 60), 'старое')
+        self.compute.assert_not_called()
+
+    def test_miss_is_computed_and_stored(self):
+        """Промах вычисляется и сохраняется, блокировка снимается."""
+        self.assertEqual(get_or_compute(KEY, self.compute, 60), 'новое')
+        self.assertEqual(cache.get(KEY)[0], 'новое')
+        self.assertIsNone(cache.get(f'{KEY}.lock'))
+
+    def test_stale_value_is_served_while_revalidating(self):
+        """
+        Пока другой запрос пересчитывает значение,
+        устаревшее значение отдается без пересчета.
+        """
+        self.put('старое', -1)
+        cache.add(f'{KEY}.lock', 1)
+        self.assertEqual(
+            get_or_compute(KEY, self.compute, 60, stale_timeout=60), 'старое'
+        )
+        self.compute.assert_not_called()
+
+    def test_expired_value_is_recomputed_by_lock_owner(self):
+        """Запрос, взявший блокировку, пересчитывает значение."""
+        self.put('старое', -1)
+        self.assertEqual(get_or_compute(KEY, self.compute, 60), 'новое')
+        self.compute.assert_called_once()
+
+    def test_waiters_get_value_of_lock_owner(self):
+        """Без значения в кэше запросы ждут результата пересчета."""
+        cache.add(f'{KEY}.lock', 1)
+
+        def finish_other_request(seconds):
+            self.put('посчитано другим', 60)
+
+        with mock.patch('core.cache.time.sleep', finish_other_request):
+            value = get_or_compute(KEY, self.compute, 60)
+        self.assertEqual(value, 'посчитано другим')
+        self.compute.assert_not_called()
+
+    def test_probabilistic_early_refresh(self):
+        """
+        Долгое вычисление близко к концу срока
+        обновляется заранее.
+        """
+        self.put('старое', 1, delta=10)
+        with mock.patch('core.cache.random.random', return_value=0.99):
+            self.assertEqual(get_or_compute(KEY, self.compute, 60), 'новое')
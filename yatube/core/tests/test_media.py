@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from core.media import parse_range
+
+HASHED = 'cache/ab/cd/' + 'a' * 32 + '.jpg'
+CONTENT = b'0123456789'
+
+
+class MediaViewTest(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        for name in ('posts/plain.jpg', HASHED):
+            path = os.path.join(self.root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(CONTENT)
+        settings = override_settings(MEDIA_ROOT=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_whole_file_is_streamed(self):
+        """Файл отдается потоком, хешированное имя кэшируется навсегда."""
+        response = self.client.get(f'/media/{HASHED}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(self.body(response), CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_plain_name_is_not_immutable(self):
+        response = self.client.get('/media/posts/plain.jpg')
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_range_request(self):
+        """Range отдает только запрошенную часть файла."""
+        response = self.client.get(
+            f'/media/{HASHED}', HTTP_RANGE='bytes=2-5'
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Content-Length'], '4')
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(
+            f'/media/{HASHED}', HTTP_RANGE='bytes=20-'
+        )
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_not_modified(self):
+        response = self.client.get(f'/media/{HASHED}')
+        response = self.client.get(
+            f'/media/{HASHED}',
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_and_outside_files(self):
+        for path in ('/media/posts/none.jpg', '/media/../manage.py'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).status_code, 404)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT='/protected/')
+    def test_accel_redirect(self):
+        """С X-Accel-Redirect файл отдает nginx, тела у ответа нет."""
+        response = self.client.get(f'/media/{HASHED}')
+        self.assertEqual(
+            response['X-Accel-Redirect'], f'/protected/{HASHED}'
+        )
+        self.assertEqual(response.content, b'')
+
+
+class ParseRangeTest(SimpleTestCase):
+    def test_forms(self):
+        cases = {
+            'bytes=0-': (0, 10),
+            'bytes=3-100': (3, 7),
+            'bytes=-4': (6, 4),
+            'bytes=0-1,4-5': None,
+            'items=0-1': None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 10), expected)
+
+    def test_unsatisfiable(self):
+        for header in ('bytes=10-', 'bytes=5-3', 'bytes=-0'):
+            with self.subTest(header=header):
+                with self.assertRaises(ValueError):
+                    parse_range(header, 10)
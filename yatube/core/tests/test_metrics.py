@@ -0,0 +1,117 @@
+import gc
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from core import metrics
+from core.metrics import RequestStats, collect
+from posts.models import Post
+
+User = get_user_model()
+
+INDEX = (('view', 'posts:index'),)
+
+
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def counter(self, name, labels=INDEX):
+        return collect()[0].get((name, labels), 0)
+
+    def test_request_is_measured(self):
+        """Запрос попадает в гистограмму и счетчики своего представления."""
+        requests = self.counter(
+            'requests_total', INDEX + (('status', 200),)
+        )
+        observed = collect()[1].get(('request_duration_seconds', INDEX))
+        observed = observed[-1] if observed else 0
+        queries = self.counter('db_queries_total')
+        misses = self.counter('cache_misses_total')
+        self.client.get('/')
+        self.assertEqual(
+            self.counter('requests_total', INDEX + (('status', 200),)),
+            requests + 1,
+        )
+        self.assertEqual(
+            collect()[1][('request_duration_seconds', INDEX)][-1],
+            observed + 1,
+        )
+        self.assertGreater(self.counter('db_queries_total'), queries)
+        self.assertGreater(self.counter('cache_misses_total'), misses)
+        self.assertGreater(self.counter('template_render_seconds_total'), 0)
+
+    def test_cache_hits_are_counted(self):
+        self.client.get('/')
+        hits = self.counter('cache_hits_total')
+        self.client.get('/')
+        self.assertGreater(self.counter('cache_hits_total'), hits)
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_prometheus_format(self):
+        self.client.get('/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"}', body
+        )
+        self.assertIn('# TYPE yatube_requests_total counter', body)
+        self.assertIn(
+            'yatube_requests_total{view="posts:index",status="200"}', body
+        )
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', body)
+
+    def test_metrics_are_disabled_by_default(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_ALLOWED_IPS=[])
+    def test_metrics_are_hidden_from_other_addresses(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN='secret')
+    def test_metrics_require_token(self):
+        """С токеном разрешенного адреса мало, нужен и заголовок."""
+        cases = (
+            ({}, 404),
+            ({'HTTP_AUTHORIZATION': 'Bearer wrong'}, 404),
+            ({'HTTP_AUTHORIZATION': 'Bearer secret'}, 200),
+        )
+        for headers, status in cases:
+            with self.subTest(headers=headers):
+                response = self.client.get('/metrics', **headers)
+                self.assertEqual(response.status_code, status)
+
+    def test_get_many_is_counted_once(self):
+        """get_many считает каждый ключ один раз."""
+        cache.set('metrics:hit', 1)
+        stats = metrics._local.stats = RequestStats()
+        try:
+            cache.get_many(['metrics:hit', 'metrics:miss', 'metrics:other'])
+        finally:
+            metrics._local.stats = None
+        self.assertEqual((stats.cache_hits, stats.cache_misses), (1, 2))
+
+    def test_finished_threads_are_folded(self):
+        """Шарды завершившихся потоков не копятся, счетчики сохраняются."""
+        labels = (('view', 'test:threads'),)
+        shards = len(metrics._shards)
+
+        def work():
+            metrics._shard().inc('requests_total', labels)
+
+        for _ in range(20):
+            thread = threading.Thread(target=work)
+            thread.start()
+            thread.join()
+        gc.collect()
+        self.assertLessEqual(len(metrics._shards), shards)
+        self.assertEqual(self.counter('requests_total', labels), 20)
@@ -0,0 +1,92 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import (
+    RequestFactory, TestCase, TransactionTestCase, override_settings
+)
+
+from core import querylog
+from core.metrics import MetricsMiddleware
+
+User = get_user_model()
+
+
+@override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_EXPLAIN_INTERVAL=60)
+class SlowQueryLogTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='author')
+
+    def setUp(self):
+        querylog._explained.clear()
+        cache.clear()
+
+    def test_query_is_logged_with_plan(self):
+        """В лог попадают SQL, параметры, строка кода и план SQLite."""
+        with self.assertLogs('core.querylog', 'WARNING') as logs:
+            list(User.objects.filter(username='author'))
+        record = logs.records[0]
+        self.assertIn('auth_user', record.sql)
+        self.assertEqual(list(record.params), ['author'])
+        self.assertIn('test_querylog.py', record.getMessage())
+        self.assertIn('SEARCH', record.plan)
+
+    def test_plan_is_rate_limited(self):
+        """План одного и того же запроса снимается один раз за интервал."""
+        with self.assertLogs('core.querylog', 'WARNING') as logs:
+            list(User.objects.filter(username='author'))
+            list(User.objects.filter(username='author'))
+        plans = [record.plan for record in logs.records]
+        self.assertIsNotNone(plans[0])
+        self.assertIsNone(plans[1])
+
+    def test_template_line_is_logged(self):
+        template = Template('\n{% for user in users %}{{ user }}{% endfor %}')
+        with self.assertLogs('core.querylog', 'WARNING') as logs:
+            template.render(Context({'users': User.objects.all()}))
+        self.assertIn('шаблон: <unknown source>:2', logs.output[0])
+
+    def test_view_is_logged(self):
+        with self.assertLogs('core.querylog', 'WARNING') as logs:
+            self.client.get('/')
+        self.assertIn('представление: posts:index', logs.output[0])
+
+    @override_settings(SLOW_QUERY_MS=10 ** 6)
+    def test_fast_queries_are_not_logged(self):
+        with self.assertNoLogs('core.querylog', 'WARNING'):
+            list(User.objects.all())
+
+
+@override_settings(SLOW_QUERY_MS=0)
+class SlowQueryWrappersTest(TransactionTestCase):
+    def test_wrappers_survive_connection_opened_in_request(self):
+        """
+        Соединение нового потока открывается внутри запроса: после
+        запросов журнал медленных запросов остается на месте, а обертки
+        метрик не копятся.
+        """
+        def view(request):
+            User.objects.exists()
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(view)
+        wrappers = []
+
+        def serve():
+            try:
+                for _ in range(5):
+                    middleware(RequestFactory().get('/'))
+                    wrappers.append(list(connection.execute_wrappers))
+            finally:
+                connections.close_all()
+
+        with self.assertLogs('core.querylog', 'WARNING') as logs:
+            thread = threading.Thread(target=serve)
+            thread.start()
+            thread.join()
+        self.assertEqual(wrappers, [[querylog.log_slow_queries]] * 5)
+        self.assertEqual(len(logs.records), 5)
@@ -0,0 +1,60 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+CSS = b'body { color: #212529; }\n' * 40
+
+
+class CompressedManifestStorageTest(SimpleTestCase):
+    def setUp(self):
+        source = tempfile.mkdtemp()
+        root = tempfile.mkdtemp()
+        for directory in (source, root):
+            self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        os.makedirs(os.path.join(source, 'css'))
+        with open(os.path.join(source, 'css', 'site.css'), 'wb') as file:
+            file.write(CSS)
+        with open(os.path.join(source, 'logo.png'), 'wb') as file:
+            file.write(b'\x89PNG' + b'\x00' * 512)
+        settings = override_settings(
+            STATICFILES_DIRS=[source],
+            STATIC_ROOT=root,
+            STATICFILES_STORAGE=(
+                'core.staticfiles.CompressedManifestStaticFilesStorage'
+            ),
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.root = root
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_collectstatic_writes_hashed_and_gzipped_files(self):
+        """Текстовые файлы получают хеш в имени и копию .gz."""
+        name = staticfiles_storage.stored_name('css/site.css')
+        self.assertRegex(name, r'^css/site\.[0-9a-f]{12}\.css$')
+        with open(os.path.join(self.root, name + '.gz'), 'rb') as file:
+            self.assertEqual(gzip.decompress(file.read()), CSS)
+        png = staticfiles_storage.stored_name('logo.png')
+        self.assertFalse(os.path.exists(os.path.join(self.root, png + '.gz')))
+
+    def test_precompressed_file_is_served(self):
+        """Сжатая копия отдается без сжатия на запрос и кэшируется."""
+        name = staticfiles_storage.stored_name('css/site.css')
+        response = self.client.get(
+            f'/static/{name}', HTTP_ACCEPT_ENCODING='gzip, deflate'
+        )
+        body = b''.join(response.streaming_content)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(gzip.decompress(body), CSS)
+
+        response = self.client.get(f'/static/{name}')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), CSS)
@@ -0,0 +1,39 @@
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.storage import ContentAddressedStorage, is_hashed
+
+
+class ContentAddressedStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_name_is_sharded_content_hash(self):
+        """Имя файла - хеш содержимого во вложенных каталогах."""
+        name = self.storage.save('posts/Photo.PNG', ContentFile(b'abc'))
+        digest = (
+            'ba7816bf8f01cfea414140de5dae2223'
+            'b00361a396177a9cb410ff61f20015ad'
+        )
+        self.assertEqual(name, f'posts/ba/78/{digest}.png')
+        self.assertTrue(is_hashed(name))
+        with self.storage.open(name) as saved:
+            self.assertEqual(saved.read(), b'abc')
+
+    def test_identical_uploads_share_one_file(self):
+        """Повторная загрузка того же содержимого не создает копию."""
+        first = self.storage.save('posts/a.gif', ContentFile(b'same'))
+        second = self.storage.save('posts/b.gif', ContentFile(b'same'))
+        other = self.storage.save('posts/c.gif', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        _, files = self.storage.listdir(first.rsplit('/', 1)[0])
+        self.assertEqual(len(files), 1)
+
+    def test_flat_names_are_not_hashed(self):
+        self.assertFalse(is_hashed('posts/image.gif'))
@@ -0,0 +1,114 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import Job
+from core.tasks import claim_job, release_stale_jobs, run_pending, task
+
+calls = []
+
+
+@task
+def remember(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def explode():
+    raise RuntimeError('сбой')
+
+
+@override_settings(TASKS_EAGER=False)
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_writes_job_and_worker_runs_it(self):
+        """Задача ждет в базе, воркер выполняет ее и отмечает готовой."""
+        remember.enqueue(1)
+        self.assertEqual(calls, [])
+        job = Job.objects.get()
+        self.assertEqual(job.name, 'core.tests.test_tasks.remember')
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [1])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 1))
+
+    def test_idempotency_key(self):
+        """
+        Пока задача с ключом ждет, вторая с тем же ключом не ставится.
+        После выполнения ключ свободен.
+        """
+        remember.enqueue(1, key='once')
+        remember.enqueue(2, key='once')
+        run_pending()
+        remember.enqueue(3, key='once')
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [1, 3])
+
+    def test_failed_job_key_can_be_reused(self):
+        """Упавшая задача не блокирует ключ навсегда."""
+        explode.enqueue(key='boom')
+        Job.objects.update(status=Job.FAILED)
+        explode.enqueue(key='boom')
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 1)
+
+    def test_prune_finished_jobs(self):
+        """prune_jobs удаляет только давно завершенные задачи."""
+        for value in range(4):
+            remember.enqueue(value)
+        run_pending(limit=3)
+        old = timezone.now() - timedelta(days=30)
+        first, second, _ = Job.objects.filter(
+            status=Job.DONE
+        ).order_by('pk').values_list('pk', flat=True)
+        Job.objects.filter(pk=first).update(locked_at=old, status=Job.FAILED)
+        Job.objects.filter(pk=second).update(locked_at=old)
+        call_command('prune_jobs', stdout=StringIO())
+        self.assertEqual(
+            sorted(Job.objects.values_list('status', flat=True)),
+            [Job.DONE, Job.PENDING],
+        )
+
+    def test_delayed_job_waits(self):
+        remember.enqueue(1, delay=60)
+        self.assertEqual(run_pending(), 0)
+
+    def test_failed_job_is_retried_with_backoff(self):
+        """Упавшая задача откладывается, после лимита попыток - failed."""
+        explode.enqueue()
+        with mock.patch('core.tasks.retry_delay', return_value=30):
+            run_pending()
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('RuntimeError', job.last_error)
+
+        Job.objects.update(run_at=timezone.now())
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_job_is_claimed_once(self):
+        """Взятую одним воркером задачу не получит другой."""
+        remember.enqueue(1)
+        self.assertIsNotNone(claim_job('first'))
+        self.assertIsNone(claim_job('second'))
+
+    def test_stale_running_job_is_released(self):
+        remember.enqueue(1)
+        claim_job('crashed')
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(release_stale_jobs(), 1)
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [1])
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_mode_runs_immediately(self):
+        remember.enqueue(1)
+        self.assertEqual(calls, [1])
+        self.assertFalse(Job.objects.exists())
@@ -1,11 +1,13 @@
 from django.contrib import admin
 from .models import Comment, Group, Post
+from .search import build_match, is_available, matching_ids
 
 
 class PostAdmin(admin.ModelAdmin):
     """
     В list_display перечисляем поля, которые должны отображаться в админке.
-    Интерфейс поиска по тексту - search_fields.
+    Интерфейс поиска по тексту - search_fields, в SQLite поиск
+    идет по полнотекстовому индексу FTS5 вместо LIKE.
     Фильтрация по дате - list_filter.
     """
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
@@ -14,6 +16,13 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not build_match(search_term) or not is_available():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return queryset.filter(pk__in=matching_ids(search_term)), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
@@ -0,0 +1,76 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Group, Post, Profile, User
+
+
+def _count_of(queryset, field, outer='pk'):
+    """
+    Подзапрос COUNT(*) по внешнему ключу для массового UPDATE:
+    field ссылается на поле outer обновляемой строки.
+    """
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef(outer)}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def change_author_posts(author_id, delta):
+    """
+    Меняет счетчик постов автора. Профиль создается при первом
+    новом посте, и тогда счетчик сразу берется из базы.
+    """
+    updated = Profile.objects.filter(user_id=author_id).update(
+        posts_count=F('posts_count') + delta
+    )
+    if not updated and delta > 0:
+        Profile.objects.get_or_create(
+            user_id=author_id,
+            defaults={
+                'posts_count': Post.objects.filter(author_id=author_id).count()
+            },
+        )
+
+
+def change_group_posts(group_id, delta):
+    """Меняет счетчик постов группы."""
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            posts_count=F('posts_count') + delta
+        )
+
+
+def change_post_comments(post_id, delta):
+    """Меняет счетчик комментариев поста."""
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def recount_all():
+    """
+    Пересчитывает все счетчики несколькими UPDATE по подзапросам,
+    исправляя расхождения после массовой загрузки данных.
+    """
+    Profile.objects.bulk_create(
+        [
+            Profile(user_id=user_id)
+            for user_id in User.objects.filter(
+                posts__isnull=False
+            ).distinct().values_list('pk', flat=True)
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    Profile.objects.update(
+        posts_count=_count_of(Post.objects.all(), 'author', 'user_id')
+    )
+    Group.objects.update(posts_count=_count_of(Post.objects.all(), 'group'))
+    Post.objects.update(
+        comments_count=_count_of(Comment.objects.all(), 'post')
+    )
@@ -0,0 +1,109 @@
+from django.db import connection
+
+from core.cache import bump_generation
+from core.tasks import task
+
+from .models import FeedEntry, Follow, Post
+
+# Размер пачки при массовой записи ленты.
+FEED_BATCH_SIZE = 500
+
+
+def feed_generation(user_id):
+    """Имя поколения кэша ленты пользователя, меняется при (от)писке."""
+    return f'feed.{user_id}'
+
+
+def request_feed_generation(request):
+    return feed_generation(request.user.pk)
+
+
+def _bulk_insert(entries):
+    """Пишет записи ленты пачками, не держа в памяти весь список."""
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= FEED_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        FeedEntry(
+            user_id=user_id,
+            post_id=post.id,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers.iterator()
+    )
+
+
+def backfill_feed(user_id, author_id):
+    """Добавляет в ленту подписчика все посты автора."""
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).order_by().values_list('id', 'pub_date')
+    _bulk_insert(
+        FeedEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def prune_feed(user_id, author_id):
+    """Убирает из ленты подписчика посты автора."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild_feeds():
+    """
+    Заново собирает ленты всех пользователей одним INSERT ... SELECT
+    по подпискам. Нужна после массовой загрузки данных, которая
+    не вызывает сигналы.
+    """
+    feed = FeedEntry._meta.db_table
+    follow = Follow._meta.db_table
+    post = Post._meta.db_table
+    FeedEntry.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {feed} (user_id, post_id, author_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+            f'FROM {follow} f JOIN {post} p ON p.author_id = f.author_id'
+        )
+
+
+@task
+def fan_out(post_id):
+    """Фоновая раздача поста по лентам подписчиков."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        return
+    fan_out_post(post)
+    bump_generation()
+
+
+@task
+def backfill(user_id, author_id):
+    """
+    Фоновое заполнение ленты после подписки. Если подписчик успел
+    отписаться, лента не трогается.
+    """
+    if not Follow.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).exists():
+        return
+    backfill_feed(user_id, author_id)
+    bump_generation(feed_generation(user_id))
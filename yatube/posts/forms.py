@@ -1,13 +1,44 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
+from .images import downsize
 from .models import Comment, Post
 
 
 class PostForm(forms.ModelForm):
-    """Форма создания нового поста."""
+    """
+    Форма создания нового поста. Картинка проверяется по весу
+    (еще при загрузке, см. posts.uploads) и по числу пикселей,
+    а слишком большая уменьшается до POST_IMAGE_MAX_SIDE.
+    """
     class Meta:
         model = Post
         fields = {'text', 'group', 'image'}
 
+    def __init__(self, *args, rejected_files=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rejected_files = rejected_files
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if 'image' in self.rejected_files:
+            raise forms.ValidationError(
+                'Картинка больше %(limit)s.',
+                params={'limit': filesizeformat(settings.MAX_UPLOAD_SIZE)},
+            )
+        if not isinstance(image, UploadedFile):
+            return image
+        width, height = image.image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                'Картинка больше %(limit)d мегапикселей.',
+                params={
+                    'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6
+                },
+            )
+        return downsize(image, settings.POST_IMAGE_MAX_SIDE)
+
 
 class CommentForm(forms.ModelForm):
     """Форма создания нового поста."""
@@ -0,0 +1,63 @@
+import hashlib
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .thumbnails import post_thumbnails_ready, prefetch_thumbnails
+
+# Фрагменты не зависят от пользователя, поэтому живут долго:
+# при изменении поста меняется их ключ, а не содержимое.
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+FRAGMENT_TEMPLATE = 'includes/post_card.html'
+
+
+def fragment_version(post):
+    """
+    Версия фрагмента поста: хеш всех полей, которые попадают
+    в разметку. Меняется при правке текста, картинки или ее
+    заглушки, переименовании автора и смене группы.
+    """
+    author = post.author
+    group = post.group
+    parts = (
+        post.text,
+        post.image.name or '',
+        post.image_placeholder,
+        post.pub_date.isoformat(),
+        author.username,
+        author.get_full_name(),
+        group.slug if group else '',
+    )
+    return hashlib.md5('\x00'.join(parts).encode()).hexdigest()
+
+
+def fragment_key(post):
+    return f'post_fragment:{post.id}:{fragment_version(post)}'
+
+
+def prefetch_fragments(posts):
+    """
+    Достает из кэша фрагменты всей страницы одним get_many
+    и раскладывает их по постам; для промахов остается None.
+    Для промахов заодно разом находятся миниатюры картинок.
+    """
+    keys = {fragment_key(post): post for post in posts}
+    found = cache.get_many(keys.keys())
+    for key, post in keys.items():
+        post._fragment = found.get(key)
+    prefetch_thumbnails(
+        post for post in keys.values() if post._fragment is None
+    )
+
+
+def render_fragment(post):
+    """Отдает фрагмент поста из кэша или рендерит и сохраняет его."""
+    if not hasattr(post, '_fragment'):
+        prefetch_fragments([post])
+    if post._fragment is None:
+        post._fragment = render_to_string(FRAGMENT_TEMPLATE, {'post': post})
+        # Карточку с заглушкой вместо миниатюры не кэшируем.
+        if post_thumbnails_ready(post):
+            cache.set(fragment_key(post), post._fragment, FRAGMENT_TIMEOUT)
+    return post._fragment
@@ -0,0 +1,90 @@
+import base64
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps
+
+# Сторона крошечной размытой копии картинки (LQIP) в пикселях.
+PLACEHOLDER_SIZE = 16
+
+
+def _placeholder(image):
+    """
+    Крошечная копия картинки в виде data URI для фона заглушки.
+    thumbnail() декодирует JPEG сразу в уменьшенном масштабе (draft).
+    """
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    data = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{data}'
+
+
+def image_metadata(file):
+    """
+    Ширина, высота, размер в байтах и заглушка картинки.
+    Файл читается один раз; позиция в нем восстанавливается.
+    """
+    position = file.tell()
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            width, height = image.size
+            placeholder = _placeholder(image)
+    finally:
+        file.seek(position)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_size': file.size,
+        'image_placeholder': placeholder,
+    }
+
+
+EMPTY_METADATA = {
+    'image_width': None,
+    'image_height': None,
+    'image_size': None,
+    'image_placeholder': '',
+}
+
+
+def fill_image_metadata(post):
+    """Записывает в пост данные его картинки (или очищает их)."""
+    metadata = image_metadata(post.image) if post.image else EMPTY_METADATA
+    for field, value in metadata.items():
+        setattr(post, field, value)
+
+
+def downsize(file, max_side):
+    """
+    Уменьшает картинку, у которой длинная сторона больше max_side.
+    Исходник декодируется один раз (JPEG сразу в уменьшенном масштабе
+    через draft) и сжимается на месте через reduce и resize.
+    Результат пишется во временный файл, который уходит на диск, если
+    больше лимита памяти загрузок. Картинки в пределах размера
+    и анимации возвращаются как есть.
+    """
+    file.seek(0)
+    with Image.open(file) as image:
+        if (max(image.size) <= max_side
+                or getattr(image, 'is_animated', False)):
+            file.seek(0)
+            return file
+        image_format = image.format
+        options = {}
+        if 'exif' in image.info:
+            options['exif'] = image.info['exif']
+        if image_format == 'JPEG':
+            options['quality'] = 90
+        image.thumbnail((max_side, max_side), reducing_gap=2.0)
+        output = tempfile.SpooledTemporaryFile(
+            settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        image.save(output, format=image_format, **options)
+    size = output.tell()
+    output.seek(0)
+    return UploadedFile(output, file.name, file.content_type, size)
@@ -0,0 +1,80 @@
+import multiprocessing
+import os
+import resource
+import tempfile
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from posts.forms import PostForm
+from posts.images import image_metadata
+
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png'}
+
+
+def _peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _process_upload(path, image_format):
+    """
+    Обрабатывает загрузку так же, как post_create: проверка формы,
+    уменьшение и данные картинки. Возвращает прирост пикового RSS (КБ).
+    Запускается в отдельном процессе, потому что пик не сбрасывается.
+    """
+    baseline = _peak_rss_kb()
+    with open(path, 'rb') as file:
+        upload = UploadedFile(
+            file, os.path.basename(path), CONTENT_TYPES[image_format],
+            os.path.getsize(path),
+        )
+        form = PostForm({'text': 'bench'}, {'image': upload})
+        if not form.is_valid():
+            return None, form.errors.as_text()
+        image_metadata(form.cleaned_data['image'])
+    return _peak_rss_kb() - baseline, ''
+
+
+class Command(BaseCommand):
+    help = 'Замеряет пиковую память (RSS) на загрузку картинки поста.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--megapixels', type=int, nargs='+', default=[1, 8, 24],
+        )
+        parser.add_argument(
+            '--formats', nargs='+', default=['JPEG', 'PNG'],
+            choices=sorted(CONTENT_TYPES),
+        )
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        with tempfile.TemporaryDirectory() as directory:
+            for image_format in options['formats']:
+                for megapixels in options['megapixels']:
+                    path = self.make_image(
+                        directory, image_format, megapixels
+                    )
+                    with context.Pool(1, maxtasksperchild=1) as pool:
+                        peak, errors = pool.apply(
+                            _process_upload, (path, image_format)
+                        )
+                    size = os.path.getsize(path) // 1024
+                    if peak is None:
+                        result = f'отклонена: {errors.strip()}'
+                    else:
+                        result = f'пик RSS +{peak // 1024} МБ'
+                    self.stdout.write(
+                        f'{image_format} {megapixels} Мп '
+                        f'({size} КБ): {result}'
+                    )
+
+    def make_image(self, directory, image_format, megapixels):
+        side = int((megapixels * 10 ** 6) ** 0.5)
+        image = Image.effect_noise((side, side), 64).convert('RGB')
+        path = os.path.join(
+            directory, f'{megapixels}.{image_format.lower()}'
+        )
+        image.save(path, format=image_format)
+        return path
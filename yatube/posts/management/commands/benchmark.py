@@ -0,0 +1,251 @@
+import json
+import math
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post, User
+
+READ_ENDPOINTS = (
+    'index', 'group_list', 'profile', 'post_detail', 'follow_index',
+)
+WRITE_ENDPOINTS = (
+    'post_create', 'add_comment', 'profile_follow', 'profile_unfollow',
+)
+
+# Адрес клиента не из INTERNAL_IPS, чтобы при DEBUG
+# debug_toolbar не встраивался в замеряемые страницы.
+CLIENT_ADDR = '192.0.2.1'
+
+
+class QueryCounter:
+    """execute_wrapper, который только считает запросы."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(ordered, percent):
+    """
+    Перцентиль по отсортированным значениям методом ближайшего ранга:
+    наименьшее значение, которого не превышают percent процентов
+    выборки.
+    """
+    rank = math.ceil(percent * len(ordered) / 100)
+    return ordered[max(rank, 1) - 1]
+
+
+def summarize(durations, queries, errors, elapsed):
+    ordered = sorted(durations)
+    return {
+        'requests': len(durations),
+        'errors': errors,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 2),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 2),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 2),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 2),
+        'throughput_rps': round(len(durations) / elapsed, 1),
+        'queries_mean': round(statistics.mean(queries), 2),
+        'queries_max': max(queries),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон основных страниц и форм в одном потоке '
+        'через тестовый клиент Django: p50/p95/p99, пропускная '
+        'способность и число запросов к базе. Пишущие запросы меняют '
+        'базу, поэтому запускайте на копии с данными из manage.py seed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Замеряемых запросов на каждую страницу.',
+        )
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--endpoints', nargs='+',
+            choices=READ_ENDPOINTS + WRITE_ENDPOINTS,
+            default=READ_ENDPOINTS + WRITE_ENDPOINTS,
+        )
+        parser.add_argument(
+            '--no-writes', action='store_true',
+            help='Не замерять пишущие запросы.',
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для результатов JSON.')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения.',
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.cold = options['cold']
+        self.prepare()
+        endpoints = [
+            name for name in options['endpoints']
+            if not (options['no_writes'] and name in WRITE_ENDPOINTS)
+        ]
+        if settings.DEBUG:
+            self.stderr.write(
+                'DEBUG включен: цифры будут хуже, чем в продакшене.'
+            )
+        results = {}
+        for name in endpoints:
+            results[name] = self.measure(
+                name, options['warmup'], options['requests']
+            )
+            self.report(name, results[name])
+        data = {
+            'date': timezone.now().isoformat(),
+            'debug': settings.DEBUG,
+            'database': connection.vendor,
+            'cold_cache': self.cold,
+            'rows': {
+                model.__name__: model.objects.count()
+                for model in (User, Group, Post, Comment, Follow)
+            },
+            'endpoints': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(data, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def prepare(self):
+        """Выбирает читателя с самой большой лентой и данные для URL."""
+        self.user = User.objects.annotate(
+            follows=Count('follower')
+        ).order_by('-follows', 'pk').first()
+        if self.user is None or not Post.objects.exists():
+            raise CommandError(
+                'В базе нет данных: сначала запустите manage.py seed.'
+            )
+        self.client = Client(REMOTE_ADDR=CLIENT_ADDR)
+        self.client.force_login(self.user)
+        self.groups = list(Group.objects.values_list('slug', flat=True))
+        self.authors = list(
+            User.objects.filter(posts__isnull=False).exclude(
+                pk=self.user.pk
+            ).distinct().values_list('username', flat=True)
+        )
+        self.posts = list(Post.objects.values_list('pk', flat=True))
+        self.followed = []
+
+    def request(self, name):
+        """Метод, адрес и данные очередного запроса к странице name."""
+        if name in ('index', 'follow_index', 'post_create'):
+            url = reverse(f'posts:{name}')
+        elif name == 'group_list':
+            if not self.groups:
+                raise CommandError('В базе нет групп.')
+            url = reverse(
+                'posts:group_list', args=[self.random.choice(self.groups)]
+            )
+        elif name == 'profile':
+            url = reverse(
+                'posts:profile', args=[self.random.choice(self.authors)]
+            )
+        elif name in ('post_detail', 'add_comment'):
+            url = reverse(f'posts:{name}', args=[
+                self.random.choice(self.posts)
+            ])
+        elif name == 'profile_follow':
+            author = self.random.choice(self.authors)
+            self.followed.append(author)
+            url = reverse('posts:profile_follow', args=[author])
+        else:
+            # Отписка от авторов, на которых подписал profile_follow,
+            # или от случайного автора.
+            author = (
+                self.followed.pop() if self.followed
+                else self.random.choice(self.authors)
+            )
+            url = reverse('posts:profile_unfollow', args=[author])
+        if name in ('post_create', 'add_comment'):
+            return 'POST', url, {'text': f'Нагрузочный тест {time.time()}'}
+        return 'GET', url, None
+
+    def send(self, name):
+        method, url, data = self.request(name)
+        if self.cold:
+            cache.clear()
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            if method == 'POST':
+                response = self.client.post(url, data)
+            else:
+                response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return time.perf_counter() - started, counter.count, response
+
+    def measure(self, name, warmup, count):
+        for _ in range(warmup):
+            self.send(name)
+        durations = []
+        queries = []
+        errors = 0
+        started = time.perf_counter()
+        for _ in range(count):
+            duration, executed, response = self.send(name)
+            durations.append(duration)
+            queries.append(executed)
+            if response.status_code >= 400:
+                errors += 1
+        return summarize(
+            durations, queries, errors, time.perf_counter() - started
+        )
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<17} p50 {result["p50_ms"]:>8.2f} мс  '
+            f'p95 {result["p95_ms"]:>8.2f} мс  '
+            f'p99 {result["p99_ms"]:>8.2f} мс  '
+            f'{result["throughput_rps"]:>7.1f} запр/с  '
+            f'SQL {result["queries_mean"]:>5.1f} (макс. '
+            f'{result["queries_max"]})'
+            + (f'  ошибок {result["errors"]}' if result['errors'] else '')
+        )
+
+    def compare(self, path, results):
+        with open(path) as file:
+            previous = json.load(file)['endpoints']
+        self.stdout.write(f'Сравнение с {path}:')
+        for name, result in results.items():
+            before = previous.get(name)
+            if not before:
+                continue
+            changes = '  '.join(
+                f'{key[:-3]} {self.change(before[key], result[key])}'
+                for key in ('p50_ms', 'p95_ms', 'p99_ms')
+            )
+            self.stdout.write(
+                f'{name:<17} {changes}  SQL '
+                f'{before["queries_mean"]} -> {result["queries_mean"]}'
+            )
+
+    def change(self, before, after):
+        if not before:
+            return f'{after} мс'
+        return f'{(after - before) / before * 100:+.1f}%'
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from core.cache import bump_generation
+from posts.images import image_metadata
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет размеры и заглушки картинок постов, '
+        'загруженных до появления этих полей.'
+    )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').filter(
+            image_size__isnull=True
+        ).only('id', 'image')
+        filled = 0
+        for post in posts.iterator():
+            try:
+                with post.image.open('rb'):
+                    metadata = image_metadata(post.image)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'{post.image.name}: {error}')
+                continue
+            Post.objects.filter(pk=post.pk).update(**metadata)
+            filled += 1
+        if filled:
+            bump_generation()
+        self.stdout.write(
+            self.style.SUCCESS(f'Заполнены данные {filled} картинок.')
+        )
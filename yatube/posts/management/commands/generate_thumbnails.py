@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import (
+    generate_thumbnails, thumbnails_generated, thumbnails_ready
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает недостающие миниатюры картинок постов, '
+        'загруженных до появления очереди миниатюр.'
+    )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct()
+        created = 0
+        for name in names.iterator():
+            if thumbnails_ready(name):
+                continue
+            thumbnails_generated(generate_thumbnails(name))
+            created += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Созданы миниатюры для {created} картинок.')
+        )
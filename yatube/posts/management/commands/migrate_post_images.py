@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.cache import bump_generation
+from core.storage import is_hashed
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails, thumbnails_generated
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов из плоского каталога posts/ '
+        'в хранилище с именами по хешу содержимого.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов читать из базы за раз.',
+        )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        posts = Post.objects.exclude(image='').order_by('pk')
+        last_pk = 0
+        moved = 0
+        while True:
+            batch = list(
+                posts.filter(pk__gt=last_pk).values_list('pk', 'image')[
+                    :options['batch_size']
+                ]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            for old_name in {name for _, name in batch}:
+                if is_hashed(old_name) or not storage.exists(old_name):
+                    continue
+                with storage.open(old_name) as content:
+                    new_name = storage.save(old_name, content)
+                # Один файл может быть у нескольких постов.
+                with transaction.atomic():
+                    Post.objects.filter(image=old_name).update(image=new_name)
+                storage.delete(old_name)
+                thumbnails_generated(generate_thumbnails(new_name))
+                moved += 1
+            self.stdout.write(f'Обработаны посты до id={last_pk}.')
+        if moved:
+            bump_generation()
+        self.stdout.write(
+            self.style.SUCCESS(f'Перенесено картинок: {moved}.')
+        )
@@ -0,0 +1,183 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from faker import Faker
+
+from core.cache import bump_generation
+from posts.counters import recount_all
+from posts.feed import rebuild_feeds
+from posts.models import Comment, Follow, Group, Post, User
+from posts.search import ensure_search_index
+
+# Пароль всех созданных пользователей: хеш считается один раз.
+PASSWORD = 'seed-password'
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, '
+        'постами, комментариями и подписками для нагрузочных тестов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Подписок на одного пользователя.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора, чтобы данные повторялись.',
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        started = time.monotonic()
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            groups = self.create_groups(options['groups'])
+            authors = self.authors(users)
+            posts = self.create_posts(options['posts'], authors, groups)
+            self.create_comments(options['comments'], users, posts)
+            self.create_follows(options['follows'], users)
+            self.stage('Счетчики', recount_all)
+            self.stage('Ленты подписок', rebuild_feeds)
+            self.stage('Поисковый индекс', ensure_search_index)
+        bump_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с.'
+        ))
+
+    def stage(self, title, func):
+        started = time.monotonic()
+        func()
+        self.stdout.write(f'{title}: {time.monotonic() - started:.1f} с')
+
+    def bulk_create(self, model, objects):
+        """
+        Пишет объекты пачками и возвращает id новых строк. SQLite
+        не возвращает id из bulk_create, поэтому они читаются
+        после вставки как все id больше прежнего максимума.
+        """
+        started = time.monotonic()
+        last = model.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+        ids = list(
+            model.objects.filter(pk__gt=last).order_by('pk').values_list(
+                'pk', flat=True
+            )
+        )
+        self.stdout.write(
+            f'{model.__name__}: {len(ids)} '
+            f'за {time.monotonic() - started:.1f} с'
+        )
+        return ids
+
+    def next_number(self, model):
+        """Номер для уникальных имен, не занятый прошлыми запусками."""
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        start = self.next_number(User)
+        return self.bulk_create(User, (
+            User(
+                username=f'seed{start + number}',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                email=f'seed{start + number}@example.com',
+                password=password,
+            )
+            for number in range(count)
+        ))
+
+    def create_groups(self, count):
+        start = self.next_number(Group)
+        return self.bulk_create(Group, (
+            Group(
+                title=self.fake.catch_phrase()[:200],
+                slug=f'seed-{start + number}',
+                description=self.fake.paragraph(),
+            )
+            for number in range(count)
+        ))
+
+    def authors(self, users):
+        """
+        Веса авторов по закону Ципфа: немногие пишут много,
+        большинство почти не пишет. Возвращает пары (id, вес).
+        """
+        return [
+            (author_id, 1 / rank)
+            for rank, author_id in enumerate(users, start=1)
+        ]
+
+    def create_posts(self, count, authors, groups):
+        if not authors:
+            return []
+        ids = [author_id for author_id, _ in authors]
+        weights = [weight for _, weight in authors]
+        return self.bulk_create(Post, (
+            Post(
+                text=self.fake.text(max_nb_chars=400),
+                author_id=self.random.choices(ids, weights)[0],
+                group_id=(
+                    self.random.choice(groups)
+                    if groups and self.random.random() < 0.7 else None
+                ),
+            )
+            for _ in range(count)
+        ))
+
+    def create_comments(self, count, users, posts):
+        if not posts or not users:
+            return []
+        return self.bulk_create(Comment, (
+            Comment(
+                text=self.fake.sentence(),
+                author_id=self.random.choice(users),
+                post_id=self.random.choice(posts),
+            )
+            for _ in range(count)
+        ))
+
+    def create_follows(self, per_user, users):
+        """
+        Каждый пользователь подписывается на per_user случайных
+        авторов. Подписки равномерные: лента пользователя в среднем
+        содержит per_user * posts / users записей, а всего строк
+        в лентах около per_user * posts.
+        """
+        def follows():
+            for user_id in users:
+                candidates = self.random.sample(
+                    users, min(per_user + 1, len(users))
+                )
+                followed = [
+                    author_id for author_id in candidates
+                    if author_id != user_id
+                ][:per_user]
+                for author_id in followed:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        return self.bulk_create(Follow, follows())
@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет счетчики для уже существующих данных."""
+    Post = apps.get_model('posts', 'Post')
+    Group = apps.get_model('posts', 'Group')
+    Comment = apps.get_model('posts', 'Comment')
+    Profile = apps.get_model('posts', 'Profile')
+    posts_by_author = Post.objects.order_by().values(
+        'author_id'
+    ).annotate(total=models.Count('pk'))
+    Profile.objects.bulk_create(
+        [
+            Profile(user_id=row['author_id'], posts_count=row['total'])
+            for row in posts_by_author
+        ],
+        batch_size=500,
+    )
+    for row in Post.objects.filter(group__isnull=False).order_by().values(
+        'group_id'
+    ).annotate(total=models.Count('pk')):
+        Group.objects.filter(pk=row['group_id']).update(
+            posts_count=row['total']
+        )
+    for row in Comment.objects.order_by().values('post_id').annotate(
+        total=models.Count('pk')
+    ):
+        Post.objects.filter(pk=row['post_id']).update(
+            comments_count=row['total']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0020_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество постов'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
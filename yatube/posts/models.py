@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from core.models import CreatedModel
+from core.storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -32,9 +33,40 @@ class Post(CreatedModel):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         help_text='Добавьте картинку к своему посту'
     )
+    # Размеры и заглушка картинки считаются один раз при загрузке,
+    # чтобы шаблоны не открывали файл.
+    image_width = models.PositiveIntegerField(
+        verbose_name='Ширина картинки',
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    image_height = models.PositiveIntegerField(
+        verbose_name='Высота картинки',
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    image_size = models.PositiveIntegerField(
+        verbose_name='Размер картинки в байтах',
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    image_placeholder = models.TextField(
+        verbose_name='Заглушка картинки',
+        blank=True,
+        editable=False,
+    )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Количество комментариев',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         """
@@ -43,6 +75,16 @@ class Post(CreatedModel):
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text
@@ -64,6 +106,11 @@ class Group(models.Model):
     description = models.TextField(
         verbose_name='Описание'
     )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Количество постов',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self):
         return self.title
@@ -97,6 +144,12 @@ class Comment(CreatedModel):
         Укажем по умолчанию фильтрацию по дате по убыванию.
         """
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['post', '-pub_date', '-id'],
+                name='comment_post_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text
@@ -118,9 +171,80 @@ class Follow(models.Model):
     )
 
     class Meta:
-        """Уникальное значение для сочетания автор-подписчик."""
+        """
+        Уникальное значение для сочетания автор-подписчик.
+        Индекс (user, author) обслуживает поиск подписок пользователя.
+        """
         constraints = [
             models.UniqueConstraint(
                 fields=['author', 'user'], name='unique_follow'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'], name='follow_user_author_idx'
+            ),
+        ]
+
+
+class Profile(models.Model):
+    """
+    Счетчики автора, которые поддерживаются сигналами,
+    чтобы не считать посты автора при каждом показе страницы.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='profile',
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Количество постов',
+        default=0,
+    )
+
+
+class FeedEntry(models.Model):
+    """
+    Материализованная лента подписок. Для каждого подписчика хранится
+    ссылка на пост автора и дата публикации, чтобы страница ленты
+    читалась одним проходом по индексу (user, -pub_date).
+    Заполняется при публикации поста и при подписке,
+    очищается при отписке.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        """
+        Пост попадает в ленту пользователя один раз.
+        Индекс по автору нужен для очистки ленты при отписке.
+        """
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx',
+            ),
+        ]
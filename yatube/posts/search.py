@@ -0,0 +1,130 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+# Полнотекстовый индекс по тексту постов (SQLite FTS5).
+FTS_TABLE = 'posts_post_fts'
+
+FTS_SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"text, content='posts_post', content_rowid='id', "
+    f"tokenize='unicode61')",
+)
+
+# Триггеры держат индекс в согласии с posts_post при любой записи,
+# включая bulk_create и update(), которые не вызывают сигналы.
+FTS_TRIGGERS = {
+    f'{FTS_TABLE}_insert': (
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert "
+        f"AFTER INSERT ON posts_post BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); "
+        f"END"
+    ),
+    f'{FTS_TABLE}_delete': (
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete "
+        f"AFTER DELETE ON posts_post BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); "
+        f"END"
+    ),
+    f'{FTS_TABLE}_update': (
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update "
+        f"AFTER UPDATE OF text ON posts_post BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); "
+        f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); "
+        f"END"
+    ),
+}
+
+
+def is_available(db=connection):
+    return db.vendor == 'sqlite'
+
+
+def ensure_search_index(db=connection):
+    """
+    Создает таблицу FTS5 и триггеры, если их нет. SQLite пересоздает
+    таблицу posts_post при изменении ее схемы, и триггеры при этом
+    теряются, поэтому функция вызывается и после каждой миграции;
+    если чего-то не хватало, индекс перестраивается целиком.
+    """
+    if not is_available(db):
+        return
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name = %s OR "
+            "(type = 'trigger' AND tbl_name = 'posts_post')",
+            [FTS_TABLE],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if FTS_TABLE in existing and existing >= FTS_TRIGGERS.keys():
+            return
+        for statement in FTS_SCHEMA:
+            cursor.execute(statement)
+        for statement in FTS_TRIGGERS.values():
+            cursor.execute(statement)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+
+
+def drop_search_index(db=connection):
+    if not is_available(db):
+        return
+    with db.cursor() as cursor:
+        for name in FTS_TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def build_match(query):
+    """
+    Превращает пользовательский запрос в выражение MATCH:
+    каждое слово берется в кавычки (спецсимволы FTS5 не ломают
+    запрос) и ищется по префиксу.
+    """
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_post_ids(query, limit, offset=0):
+    """Id постов, подходящих под запрос, по убыванию релевантности (bm25)."""
+    match = build_match(query)
+    if not match:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY rank LIMIT %s OFFSET %s',
+            [match, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def matching_ids(query):
+    """Подзапрос с id подходящих постов для фильтра pk__in."""
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (build_match(query),),
+    )
+
+
+def search_posts(query, limit, offset=0):
+    """
+    Посты по запросу в порядке релевантности. Без FTS5 (не SQLite)
+    используется обычный поиск по подстроке от новых к старым.
+    """
+    posts = Post.objects.select_related('author', 'group')
+    if not is_available():
+        if not query:
+            return []
+        return list(
+            posts.filter(text__icontains=query)[offset:offset + limit]
+        )
+    ids = search_post_ids(query, limit, offset)
+    found = posts.in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
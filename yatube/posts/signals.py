@@ -0,0 +1,100 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.cache import bump_generation
+
+from .counters import (
+    change_author_posts, change_group_posts, change_post_comments
+)
+from .feed import backfill, fan_out, feed_generation, prune_feed
+from .images import fill_image_metadata
+from .models import Comment, Follow, Group, Post
+
+
+@receiver(pre_save, sender=Post)
+def post_group_before_save(sender, instance, **kwargs):
+    """Запоминает прежнюю группу поста, чтобы перенести счетчик."""
+    if instance.pk is None:
+        instance._previous_group_id = None
+        return
+    instance._previous_group_id = Post.objects.filter(
+        pk=instance.pk
+    ).values_list('group_id', flat=True).first()
+
+
+@receiver(pre_save, sender=Post)
+def post_image_before_save(sender, instance, **kwargs):
+    """
+    Размеры и заглушка считаются только для новой, еще не
+    сохраненной картинки или когда картинку убрали из поста.
+    """
+    image = instance.image
+    if image and image._committed:
+        return
+    if not image and instance.image_size is None:
+        return
+    fill_image_metadata(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    """
+    Новый пост сразу попадает в счетчики, а в ленты подписчиков -
+    фоновой задачей. При смене группы счетчик переносится в новую группу.
+    """
+    if created:
+        fan_out.enqueue(instance.pk, key=f'fan_out:{instance.pk}')
+        change_author_posts(instance.author_id, 1)
+        change_group_posts(instance.group_id, 1)
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        change_group_posts(previous_group_id, -1)
+        change_group_posts(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    """Удаленный пост вычитается из счетчиков автора и группы."""
+    change_author_posts(instance.author_id, -1)
+    change_group_posts(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        change_post_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    change_post_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    """
+    При подписке поколение ленты меняется сразу, чтобы профиль
+    показал кнопку отписки, а лента заполняется постами автора в фоне.
+    """
+    if created:
+        bump_generation(feed_generation(instance.user_id))
+        backfill.enqueue(
+            instance.user_id, instance.author_id,
+            key=f'backfill:{instance.pk}',
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """При отписке посты автора убираются из ленты."""
+    prune_feed(instance.user_id, instance.author_id)
+    bump_generation(feed_generation(instance.user_id))
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Group)
+def content_changed(sender, **kwargs):
+    """Любое изменение контента сбрасывает кэш страниц."""
+    bump_generation()
@@ -0,0 +1,31 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.fragments import render_fragment
+from posts.models import Follow
+from posts.thumbnails import post_picture as get_post_picture
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_fragment(post):
+    """
+    Выводит карточку поста из кэша фрагментов.
+    """
+    return mark_safe(render_fragment(post))
+
+
+@register.simple_tag(takes_context=True)
+def is_following(context, username):
+    """Подписан ли текущий пользователь на автора username."""
+    user = context['request'].user
+    return user.is_authenticated and Follow.objects.filter(
+        user=user, author__username=username
+    ).exists()
+
+
+@register.simple_tag
+def post_picture(post):
+    """Миниатюры поста для <picture> или None, пока их нет."""
+    return get_post_picture(post)
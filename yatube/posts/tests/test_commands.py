@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+
+from ..management.commands.benchmark import percentile
+from ..models import Comment, FeedEntry, Follow, Group, Post, Profile
+
+User = get_user_model()
+
+
+class SeedCommandTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        call_command(
+            'seed', users=20, groups=3, posts=60, comments=40, follows=2,
+            batch_size=25, stdout=StringIO(),
+        )
+
+    def test_seed_creates_consistent_data(self):
+        """seed создает данные и сразу пересчитывает счетчики и ленты."""
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertEqual(Follow.objects.count(), 40)
+        self.assertFalse(Follow.objects.filter(
+            user_id=F('author_id')
+        ).exists())
+        self.assertEqual(
+            sum(Profile.objects.values_list('posts_count', flat=True)), 60
+        )
+        self.assertEqual(
+            sum(Post.objects.values_list('comments_count', flat=True)), 40
+        )
+        expected = sum(
+            Post.objects.filter(author_id=follow.author_id).count()
+            for follow in Follow.objects.all()
+        )
+        self.assertEqual(FeedEntry.objects.count(), expected)
+
+    def test_seed_can_run_twice(self):
+        call_command(
+            'seed', users=5, groups=1, posts=5, comments=5, follows=1,
+            stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 25)
+
+    def test_benchmark_writes_json(self):
+        """benchmark замеряет страницы и сохраняет результат в JSON."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        path = os.path.join(directory, 'result.json')
+        self.addCleanup(os.remove, path)
+        call_command(
+            'benchmark', requests=3, warmup=1, output=path,
+            stdout=StringIO(), stderr=StringIO(),
+        )
+        with open(path) as file:
+            result = json.load(file)
+        self.assertEqual(result['rows']['Post'], 60 + 4)
+        for name, endpoint in result['endpoints'].items():
+            with self.subTest(endpoint=name):
+                self.assertEqual(endpoint['requests'], 3)
+                self.assertEqual(endpoint['errors'], 0)
+                self.assertLessEqual(endpoint['p50_ms'], endpoint['p99_ms'])
+                self.assertGreater(endpoint['queries_max'], 0)
+
+    def test_percentile_uses_nearest_rank(self):
+        ordered = list(range(1, 21))
+        self.assertEqual(percentile(ordered, 50), 10)
+        self.assertEqual(percentile(ordered, 95), 19)
+        self.assertEqual(percentile(ordered, 99), 20)
+        self.assertEqual(percentile([7], 99), 7)
@@ -1,12 +1,29 @@
 import shutil
 import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Job
+from core.storage import is_hashed
+from core.tasks import run_pending
+from ..fragments import fragment_key
 from ..models import Group, Post
+from ..thumbnails import (
+    _card_sizes, generate_thumbnails, post_picture, thumbnail_url,
+    thumbnails_generated
+)
 from django.contrib.auth import get_user_model
+from django.core.files.storage import FileSystemStorage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
+from PIL import Image
 
 User = get_user_model()
 
@@ -36,6 +53,7 @@ class ImagesTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
@@ -96,6 +114,245 @@ class ImagesTests(TestCase):
             "posts:profile", kwargs={"username": self.post.author})
         )
         self.assertEqual(Post.objects.count(), posts_count + 1)
-        self.assertTrue(test.image.name.endswith(
-            new_post["image"].name)
+        # Картинка хранится под хешем содержимого.
+        self.assertTrue(is_hashed(test.image.name))
+        self.assertTrue(test.image.name.endswith('.gif'))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Painter')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def upload(self):
+        return SimpleUploadedFile(
+            name='small.gif',
+            content=(
+                b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                b'\x0A\x00\x3B'
+            ),
+            content_type='image/gif',
+        )
+
+    def test_create_schedules_thumbnails(self):
+        """post_create ставит миниатюры в очередь фоновых задач."""
+        with override_settings(TASKS_EAGER=False):
+            self.client.post(
+                reverse('posts:post_create'),
+                {'text': 'С картинкой', 'image': self.upload()},
+            )
+        post = Post.objects.get(text='С картинкой')
+        job = Job.objects.get(name='posts.thumbnails.make_thumbnails')
+        self.assertEqual(job.key, f'thumbnails:{post.image.name}')
+        self.assertIsNone(thumbnail_url(post.image))
+        run_pending()
+        self.assertIsNotNone(thumbnail_url(post.image))
+
+    def test_edit_without_new_image_does_not_schedule(self):
+        """Правка текста не пересоздает миниатюры."""
+        post = Post.objects.create(
+            author=self.user, text='Старый', image=self.upload()
+        )
+        with mock.patch(
+            'posts.thumbnails.make_thumbnails.enqueue'
+        ) as enqueue:
+            self.client.post(
+                reverse('posts:post_edit', kwargs={'post_id': post.id}),
+                {'text': 'Новый'},
+            )
+        enqueue.assert_not_called()
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """
+        Пока миниатюры нет, выводится заглушка и карточка не кэшируется;
+        после создания миниатюры страница показывает картинку.
+        """
+        post = Post.objects.create(
+            author=self.user, text='Картинка', image=self.upload()
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'aspect-ratio')
+        self.assertNotContains(response, '<img class="card-img')
+        self.assertIsNone(cache.get(fragment_key(post)))
+
+        thumbnails_generated(generate_thumbnails(post.image.name))
+        url = thumbnail_url(post.image)
+        small = thumbnail_url(post.image, 'card-480')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(
+            response, f'src="{url}" srcset="{small} 480w, {url} 960w"'
+        )
+        self.assertIsNotNone(cache.get(fragment_key(post)))
+
+    def test_picture_lists_modern_formats(self):
+        """Для WebP выводится отдельный source со своим srcset."""
+        post = Post(image='posts/picture.png')
+        sizes = _card_sizes(['WEBP'])
+        post._thumbnails = {size: f'/{size}' for size in sizes}
+        with mock.patch.multiple(
+            'posts.thumbnails', FORMATS=['WEBP'], THUMBNAIL_SIZES=sizes
+        ):
+            picture = post_picture(post)
+        self.assertEqual(picture['src'], '/card-960')
+        self.assertEqual(
+            picture['srcset'], '/card-480 480w, /card-960 960w'
+        )
+        self.assertEqual(picture['sources'], [{
+            'type': 'image/webp',
+            'srcset': '/card-480-webp 480w, /card-960-webp 960w',
+        }])
+
+    def test_picture_waits_for_every_size(self):
+        """Пока готовы не все размеры, вместо картинки заглушка."""
+        post = Post(image='posts/picture.png')
+        post._thumbnails = {'card-960': '/card-960'}
+        self.assertIsNone(post_picture(post))
+
+    def test_page_resolves_thumbnails_in_one_query(self):
+        """Миниатюры страницы находятся одним запросом к хранилищу sorl."""
+        for number in range(3):
+            post = Post.objects.create(
+                author=self.user, text=f'Пост {number}', image=self.upload()
+            )
+            thumbnails_generated(generate_thumbnails(post.image.name))
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertEqual(
+            response.content.decode().count('<img class="card-img'), 3
+        )
+
+    def test_upload_stores_image_metadata(self):
+        """Размеры, вес и заглушка картинки сохраняются при загрузке."""
+        post = Post.objects.create(
+            author=self.user, text='Размеры', image=self.upload()
+        )
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, post.image.size)
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/png;base64,')
         )
+
+        post.image = None
+        post.save()
+        post.refresh_from_db()
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_placeholder, '')
+
+    def test_render_does_not_open_image(self):
+        """Страница с картинкой рендерится без чтения файла."""
+        post = Post.objects.create(
+            author=self.user, text='Без файла', image=self.upload()
+        )
+        thumbnails_generated(generate_thumbnails(post.image.name))
+        with mock.patch('PIL.Image.open') as image_open:
+            response = self.client.get(reverse('posts:index'))
+        image_open.assert_not_called()
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, post.image_placeholder)
+
+    def test_fill_image_metadata_backfills_old_posts(self):
+        """Команда заполняет данные картинок для старых постов."""
+        post = Post.objects.create(
+            author=self.user, text='Старая', image=self.upload()
+        )
+        Post.objects.filter(pk=post.pk).update(
+            image_width=None, image_height=None, image_size=None,
+            image_placeholder='',
+        )
+        call_command('fill_image_metadata', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.image_width, 2)
+        self.assertTrue(post.image_placeholder)
+
+    def test_migrate_post_images_moves_flat_files(self):
+        """Команда переносит старые файлы в хранилище по хешу."""
+        storage = Post._meta.get_field('image').storage
+        name = 'posts/old.gif'
+        FileSystemStorage().save(name, self.upload())
+        first = Post.objects.create(author=self.user, text='1', image=name)
+        second = Post.objects.create(author=self.user, text='2', image=name)
+
+        call_command('migrate_post_images', batch_size=1, stdout=StringIO())
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertTrue(is_hashed(first.image.name))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertFalse(storage.exists(name))
+        self.assertIsNotNone(thumbnail_url(first.image))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class UploadLimitsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def upload(self, size=(40, 20)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, format='PNG')
+        return SimpleUploadedFile(
+            'big.png', buffer.getvalue(), content_type='image/png'
+        )
+
+    def create(self):
+        return self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Большая картинка', 'image': self.upload()},
+        )
+
+    @override_settings(MAX_UPLOAD_SIZE=64)
+    def test_heavy_file_is_rejected_while_uploading(self):
+        """Файл тяжелее лимита отбрасывается, форма показывает ошибку."""
+        response = self.create()
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 64\xa0байта.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_are_rejected(self):
+        response = self.create()
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 0 мегапикселей.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_SIDE=10)
+    def test_large_image_is_downsized(self):
+        """Длинная сторона уменьшается до лимита с сохранением формы."""
+        self.create()
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (10, 5))
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (10, 5))
+            self.assertEqual(image.format, 'PNG')
@@ -1,6 +1,9 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
-from ..models import Group, Post
+from ..models import Comment, Group, Post, Profile
 
 User = get_user_model()
 
@@ -55,3 +58,79 @@ class PostModelTest(TestCase):
             with self.subTest(value=value):
                 self.assertEqual(
                     self.post._meta.get_field(value).help_text, expected)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='first',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='second',
+            description='Тестовое описание',
+        )
+
+    def assertCounters(self, author_posts, group_posts, other_group_posts):
+        self.assertEqual(
+            Profile.objects.get(user=self.user).posts_count, author_posts)
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, group_posts)
+        self.assertEqual(self.other_group.posts_count, other_group_posts)
+
+    def test_post_counters_follow_create_edit_delete(self):
+        """Счетчики постов меняются при создании, смене группы, удалении."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group)
+        self.assertCounters(1, 1, 0)
+        post.group = self.other_group
+        post.save()
+        self.assertCounters(1, 0, 1)
+        post.delete()
+        self.assertCounters(0, 0, 0)
+
+    def test_comment_counter(self):
+        """Счетчик комментариев меняется при добавлении и удалении."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        comment = Comment.objects.create(
+            author=self.user, post=post, text='Комментарий')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_recount_counters_repairs_drift(self):
+        """Команда recount_counters исправляет счетчики после bulk_create."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}', group=self.group)
+            for i in range(3)
+        )
+        call_command('recount_counters', stdout=StringIO())
+        self.assertCounters(3, 3, 0)
+
+    def test_recount_matches_profiles_by_user(self):
+        """
+        Счетчик профиля берется по user_id, а не по id профиля:
+        у профилей, созданных не по порядку, они не совпадают.
+        """
+        other = User.objects.create_user(username='other')
+        Profile.objects.create(user=other)
+        Profile.objects.filter(user=self.user).delete()
+        Profile.objects.create(user=self.user)
+        self.assertNotEqual(
+            Profile.objects.get(user=self.user).pk, self.user.pk
+        )
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}') for i in range(2)
+        )
+        Post.objects.create(author=other, text='Пост')
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual(
+            Profile.objects.get(user=self.user).posts_count, 2)
+        self.assertEqual(Profile.objects.get(user=other).posts_count, 1)
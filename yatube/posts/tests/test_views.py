@@ -1,14 +1,38 @@
+import base64
+import json
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
-from ..models import Group, Follow, Post
+from ..models import Comment, FeedEntry, Group, Follow, Post
 from ..forms import PostForm
+from ..fragments import fragment_key
+from ..admin import PostAdmin
+from core.tasks import run_pending
+from core.testing import QueryBudgetMixin
+from django.contrib import admin
 from django.core.cache import cache
 from http import HTTPStatus
 
 
 User = get_user_model()
 
+# Курсоры, которые декодируются, но содержат негодные значения.
+TAMPERED_CURSORS = (
+    ['n', 'abc', 1],
+    ['n', '2020-13-45T00:00:00', 1],
+    ['n', None, None],
+    ['n', [1], {}],
+    ['p', '2020-01-01T00:00:00+00:00', 'x'],
+    ['n', '2020-01-01T00:00:00+00:00', 10 ** 30],
+)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
 
 class PostPagesTests(TestCase):
     @classmethod
@@ -84,13 +108,19 @@ class PostPagesTests(TestCase):
         self.assertTrue(response.context['is_edit'])
 
     def test_check_cache(self):
-        """Проверка кеша."""
-        response = self.authorized_client.get(reverse("posts:index"))
+        """
+        Проверка кеша: повторный запрос отдается из кеша без запросов
+        к базе, а удаление поста сразу сбрасывает кеш.
+        """
+        response = self.client.get(reverse("posts:index"))
         test_cache = response.content
-        Post.objects.get(id=1).delete()
-        response2 = self.authorized_client.get(reverse("posts:index"))
-        test_cache2 = response2.content
-        self.assertEqual(test_cache, test_cache2)
+        with self.assertNumQueries(0):
+            response2 = self.client.get(reverse("posts:index"))
+        self.assertEqual(test_cache, response2.content)
+        Post.objects.get(id=self.post.id).delete()
+        response3 = self.client.get(reverse("posts:index"))
+        self.assertNotEqual(test_cache, response3.content)
+        self.assertNotContains(response3, self.post.text)
 
 
 class PaginatorViewsTest(TestCase):
@@ -113,6 +143,7 @@ class PaginatorViewsTest(TestCase):
         Post.objects.bulk_create(fake_post)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
 
@@ -123,8 +154,73 @@ class PaginatorViewsTest(TestCase):
 
     def test_second_page_contains_five_records(self):
         """Проверим, что количество постов на второй странице равно 5"""
-        response = self.client.get(reverse('posts:index') + '?page=2')
+        response = self.client.get(reverse('posts:index'))
+        cursor = response.context['page_obj'].next_cursor
+        response = self.client.get(
+            reverse('posts:index') + f'?cursor={cursor}'
+        )
         self.assertEqual(len(response.context['page_obj']), 5)
+        self.assertFalse(response.context['page_obj'].has_next())
+
+    def test_pages_do_not_overlap(self):
+        """
+        Переход вперед и назад по курсору возвращает
+        непересекающиеся страницы в порядке от новых к старым.
+        """
+        first = self.client.get(reverse('posts:index')).context['page_obj']
+        second = self.client.get(
+            reverse('posts:index') + f'?cursor={first.next_cursor}'
+        ).context['page_obj']
+        back = self.client.get(
+            reverse('posts:index') + f'?cursor={second.previous_cursor}'
+        ).context['page_obj']
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(list(back), list(first))
+        self.assertEqual(
+            list(Post.objects.order_by('-pub_date', '-id')),
+            list(first) + list(second)
+        )
+
+    def test_last_page_and_broken_cursor(self):
+        """Курсор последней страницы и испорченный курсор."""
+        first = self.client.get(reverse('posts:index')).context['page_obj']
+        last = self.client.get(
+            reverse('posts:index')
+            + f'?cursor={first.paginator.last_cursor}'
+        ).context['page_obj']
+        self.assertEqual(len(last), 10)
+        self.assertFalse(last.has_next())
+        broken = self.client.get(
+            reverse('posts:index') + '?cursor=broken'
+        ).context['page_obj']
+        self.assertEqual(list(broken), list(first))
+
+    def test_tampered_cursor_shows_first_page(self):
+        """Курсор с подделанными значениями ведет на первую страницу."""
+        first = list(
+            self.client.get(reverse('posts:index')).context['page_obj']
+        )
+        self.client.force_login(self.user)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            for values in TAMPERED_CURSORS:
+                with self.subTest(url=url, cursor=values):
+                    cache.clear()
+                    response = self.client.get(
+                        url, {'cursor': encode_cursor(values)}
+                    )
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+        cache.clear()
+        response = self.client.get(
+            reverse('posts:index'),
+            {'cursor': encode_cursor(TAMPERED_CURSORS[0])},
+        )
+        self.assertEqual(list(response.context['page_obj']), first)
 
 
 class GroupViewsTest(TestCase):
@@ -254,3 +350,428 @@ class FollowViewTest(TestCase):
         self.authorized_client.force_login(self.second_user)
         response = self.authorized_client.get(reverse("posts:follow_index"))
         self.assertEqual(len(response.context["page_obj"]), 0)
+
+    def test_feed_is_materialized_on_post_create(self):
+        """Новый пост автора записывается в ленту подписчика."""
+        Follow.objects.create(author=self.author, user=self.user)
+        post = Post.objects.create(text="Запись в ленту", author=self.author)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user, post=post).exists()
+        )
+
+    def test_feed_is_backfilled_and_pruned(self):
+        """
+        При подписке в ленту попадают старые посты автора,
+        при отписке они из ленты удаляются.
+        """
+        Post.objects.create(text="Старый пост", author=self.author)
+        self.authorized_client.get(
+            reverse("posts:profile_follow",
+                    kwargs={"username": self.author.username})
+        )
+        self.assertEqual(
+            FeedEntry.objects.filter(
+                user=self.user, author=self.author).count(),
+            self.author.posts.count()
+        )
+        self.authorized_client.get(
+            reverse("posts:profile_unfollow",
+                    kwargs={"username": self.author.username})
+        )
+        self.assertFalse(
+            FeedEntry.objects.filter(
+                user=self.user, author=self.author).exists()
+        )
+
+    @override_settings(TASKS_EAGER=False)
+    def test_feed_is_filled_by_background_jobs(self):
+        """
+        Без TASKS_EAGER подписка и новый пост только ставят задачи,
+        ленту заполняет воркер; отписка до его запуска ничего не ломает.
+        """
+        follow = reverse("posts:profile_follow",
+                         kwargs={"username": self.author.username})
+        self.authorized_client.get(follow)
+        post = Post.objects.create(text="Новый пост", author=self.author)
+        feed = FeedEntry.objects.filter(user=self.user, author=self.author)
+        self.assertFalse(feed.exists())
+        run_pending()
+        self.assertTrue(feed.filter(post=post).exists())
+
+        self.authorized_client.get(
+            reverse("posts:profile_unfollow",
+                    kwargs={"username": self.author.username})
+        )
+        self.authorized_client.get(follow)
+        Follow.objects.filter(user=self.user).delete()
+        run_pending()
+        self.assertFalse(feed.exists())
+
+
+class PostFragmentCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='NoName')
+        cls.group = Group.objects.create(
+            title='Тестовое название группы',
+            slug='testslug',
+            description='Тестовое описание группы',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, text=f'Пост {i}', group=cls.group)
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fragments_are_cached_and_fetched_in_one_call(self):
+        """
+        Карточки постов сохраняются в кеш, а при следующей сборке
+        страницы достаются одним get_many.
+        """
+        self.client.get(reverse('posts:index'))
+        for post in self.posts:
+            with self.subTest(post=post):
+                self.assertIsNotNone(cache.get(fragment_key(post)))
+        Group.objects.create(title='Сброс', slug='reset', description='-')
+        with mock.patch(
+            'posts.fragments.cache.get_many', wraps=cache.get_many
+        ) as get_many:
+            self.client.get(reverse('posts:index'))
+        fragment_calls = [
+            call for call in get_many.call_args_list
+            if all(key.startswith('post_fragment') for key in call[0][0])
+        ]
+        self.assertEqual(len(fragment_calls), 1)
+
+    def test_fragment_key_changes_on_edit_and_rename(self):
+        """Ключ фрагмента меняется при правке поста и смене имени автора."""
+        post = Post.objects.select_related('author', 'group').get(
+            pk=self.posts[0].pk)
+        key = fragment_key(post)
+        post.text = 'Новый текст'
+        self.assertNotEqual(fragment_key(post), key)
+        post.text = self.posts[0].text
+        post.author.first_name = 'Новое имя'
+        self.assertNotEqual(fragment_key(post), key)
+        post.author.first_name = ''
+        post.group = None
+        self.assertNotEqual(fragment_key(post), key)
+
+    def test_edited_post_is_rendered_again(self):
+        """После правки на странице показывается новый текст."""
+        self.client.get(reverse('posts:index'))
+        post = Post.objects.get(pk=self.posts[0].pk)
+        post.text = 'Исправленный текст'
+        post.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Исправленный текст')
+
+
+class DonutCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(author=cls.author, text='Общий пост')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_shared_body_personal_header(self):
+        """
+        Гость и пользователь получают одну закешированную страницу,
+        но шапка у каждого своя.
+        """
+        guest_response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(guest_response, self.user.username)
+        with mock.patch('posts.views.get_paginator') as get_paginator:
+            response = self.authorized_client.get(reverse('posts:index'))
+        get_paginator.assert_not_called()
+        self.assertContains(response, self.post.text)
+        self.assertContains(response, f'Пользователь: {self.user.username}')
+        self.assertContains(response, reverse('posts:follow_index'))
+        self.assertNotContains(response, '<!--donut:')
+
+    def test_follow_button_is_personal(self):
+        """Кнопка подписки на закешированном профиле своя у каждого."""
+        url = reverse('posts:profile', kwargs={'username': 'writer'})
+        follow_url = reverse(
+            'posts:profile_follow', kwargs={'username': 'writer'})
+        unfollow_url = reverse(
+            'posts:profile_unfollow', kwargs={'username': 'writer'})
+        self.client.get(url)
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.authorized_client.get(url)
+        self.assertContains(response, unfollow_url)
+        self.assertContains(self.client.get(url), follow_url)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Тестовое название группы',
+            slug='testslug',
+            description='Тестовое описание группы',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_unchanged_pages_answer_304_without_queries(self):
+        """Неизмененные страницы отвечают 304 без запросов к базе."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'testslug'}),
+            reverse('posts:profile', kwargs={'username': 'writer'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.has_header('ETag'))
+                with self.assertNumQueries(0):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_etag_changes_with_content_and_user(self):
+        """ETag меняется после комментария и различается у пользователей."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(self.authorized_client.get(url)['ETag'], etag)
+        Post.objects.get(pk=self.post.pk).comments.create(
+            author=self.user, text='Комментарий')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_follow_index_etag_changes_on_follow(self):
+        """ETag ленты меняется после подписки."""
+        url = reverse('posts:follow_index')
+        etag = self.authorized_client.get(url)['ETag']
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, self.post.text)
+
+    @override_settings(TASKS_EAGER=False)
+    def test_profile_etag_changes_on_follow_before_backfill(self):
+        """
+        ETag профиля меняется сразу после подписки, не дожидаясь
+        фонового заполнения ленты.
+        """
+        url = reverse('posts:profile', kwargs={'username': 'writer'})
+        etag = self.authorized_client.get(url)['ETag']
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(
+            response,
+            reverse('posts:profile_unfollow', kwargs={'username': 'writer'}),
+        )
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='NoName')
+        cls.match = Post.objects.create(
+            author=cls.user, text='Кошки любят молоко и молоко любит кошек')
+        cls.weak = Post.objects.create(
+            author=cls.user, text='Про молоко один раз')
+        cls.other = Post.objects.create(author=cls.user, text='Про собак')
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:post_search'), {'q': query})
+        return response.context['posts']
+
+    def test_search_ranks_results(self):
+        """Найденные посты упорядочены по релевантности."""
+        self.assertEqual(self.search('молоко'), [self.match, self.weak])
+        self.assertEqual(self.search('кош'), [self.match])
+        self.assertEqual(self.search('"*)('), [])
+
+    def test_search_page_out_of_range(self):
+        """Огромный номер и страница за последней дают 404, а не 500."""
+        url = reverse('posts:post_search')
+        for page in ('99999999999999999999', '101', '2'):
+            with self.subTest(page=page):
+                response = self.client.get(url, {'q': 'молоко', 'page': page})
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        response = self.client.get(url, {'q': 'молоко', 'page': '1'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_index_follows_edit_and_delete(self):
+        """Индекс обновляется при правке и удалении поста."""
+        post = Post.objects.get(pk=self.other.pk)
+        post.text = 'Теперь про молоко'
+        post.save()
+        self.assertIn(post, self.search('молоко'))
+        post.delete()
+        self.assertNotIn(post, self.search('молоко'))
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке находит посты через полнотекстовый индекс."""
+        post_admin = PostAdmin(Post, admin.site)
+        queryset, duplicates = post_admin.get_search_results(
+            None, Post.objects.all(), 'собак')
+        self.assertEqual(list(queryset), [self.other])
+        self.assertFalse(duplicates)
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """
+    Число запросов каждой страницы не зависит от количества
+    постов и комментариев на ней: страница с N записями и с 2N
+    делает одинаковое число запросов и укладывается в бюджет.
+    """
+    # Сессия и пользователь + запросы самой страницы.
+    BUDGETS = {
+        'index': 3,
+        'group_list': 4,
+        'profile': 5,
+        'post_detail': 4,
+        'follow_index': 3,
+        'post_search': 4,
+    }
+    # Размеры данных: обе страницы неполные (NUMBER_OF_POSTS = 10),
+    # поэтому на второй записей вдвое больше.
+    SIZES = (4, 8)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовое название группы',
+            slug='testslug',
+            description='Тестовое описание группы',
+        )
+        cls.author = User.objects.create_user(username='writer')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        self.created = 0
+
+    def grow(self, size):
+        """
+        Добивает данные до size: постов в ленте, группе, профиле
+        и поиске, комментариев у поста.
+        """
+        for number in range(self.created, size):
+            group = Group.objects.create(
+                title=f'Группа {number}',
+                slug=f'group-{number}',
+                description='Описание',
+            )
+            author = User.objects.create_user(username=f'user-{number}')
+            Follow.objects.create(user=self.reader, author=author)
+            Post.objects.create(author=author, text='Пост', group=group)
+            post = Post.objects.create(
+                author=self.author, text='Пост', group=self.group)
+            Comment.objects.create(author=author, post=post, text='Текст')
+            Comment.objects.create(
+                author=author, post=self.post, text='Текст')
+        self.created = size
+
+    def test_views_fit_query_budget(self):
+        urls = {
+            'index': reverse('posts:index'),
+            'group_list': reverse(
+                'posts:group_list', kwargs={'slug': 'testslug'}),
+            'profile': reverse(
+                'posts:profile', kwargs={'username': 'writer'}),
+            'post_detail': reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.id}),
+            'follow_index': reverse('posts:follow_index'),
+            'post_search': reverse('posts:post_search') + '?q=Пост',
+        }
+        executed = {name: [] for name in urls}
+        for size in self.SIZES:
+            self.grow(size)
+            for name, url in urls.items():
+                with self.subTest(view=name, size=size):
+                    cache.clear()
+                    with self.assertQueryBudget(
+                        self.BUDGETS[name]
+                    ) as context:
+                        response = self.authorized_client.get(url)
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+                    executed[name].append(len(context.captured_queries))
+        for name, counts in executed.items():
+            with self.subTest(view=name):
+                self.assertEqual(len(set(counts)), 1, counts)
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='NoName')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        Comment.objects.bulk_create(
+            Comment(author=cls.user, post=cls.post, text=f'Комментарий {i}')
+            for i in range(25)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_comments(self):
+        """На странице поста только первая порция, от новых к старым."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 20)
+        self.assertTrue(comments.has_next())
+        self.assertEqual(
+            list(comments),
+            list(self.post.comments.order_by('-pub_date', '-id')[:20])
+        )
+        self.assertContains(
+            response,
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        )
+
+    def test_comments_fragment_returns_next_batch(self):
+        """Фрагмент по курсору отдает оставшиеся комментарии."""
+        first = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        ).context['comments']
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            {'cursor': first.next_cursor},
+        )
+        rest = response.context['comments']
+        self.assertEqual(len(rest), 5)
+        self.assertFalse(rest.has_next())
+        self.assertFalse(set(first) & set(rest))
+        self.assertNotContains(response, '<html')
+
+    def test_tampered_comments_cursor(self):
+        """Подделанный курсор комментариев не ломает страницы поста."""
+        urls = (
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            for values in TAMPERED_CURSORS:
+                with self.subTest(url=url, cursor=values):
+                    response = self.client.get(
+                        url, {'cursor': encode_cursor(values)}
+                    )
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+                    self.assertEqual(len(response.context['comments']), 20)
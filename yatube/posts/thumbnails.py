@@ -0,0 +1,244 @@
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.cache import bump_generation
+from core.tasks import task
+
+from .models import Post
+
+# Картинка в карточке поста: кадрирование 960x339 в нескольких
+# ширинах, чтобы телефон по srcset брал файл поменьше.
+CARD_RATIO = 339 / 960
+CARD_WIDTHS = (480, 960)
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+CARD_SIZES = '(min-width: 768px) 75vw, 100vw'
+
+# Современные форматы в порядке предпочтения; используются только те,
+# которые умеет сохранять установленный Pillow.
+MODERN_FORMATS = ('AVIF', 'WEBP')
+
+
+def _modern_formats():
+    Image.init()
+    return [fmt for fmt in MODERN_FORMATS if fmt in Image.SAVE]
+
+
+def _card_sizes(formats):
+    sizes = {}
+    for fmt in [None, *formats]:
+        for width in CARD_WIDTHS:
+            geometry = f'{width}x{round(width * CARD_RATIO)}'
+            if fmt is None:
+                sizes[f'card-{width}'] = (geometry, CARD_OPTIONS)
+            else:
+                sizes[f'card-{width}-{fmt.lower()}'] = (
+                    geometry, {**CARD_OPTIONS, 'format': fmt}
+                )
+    return sizes
+
+
+FORMATS = _modern_formats()
+# sorl знает расширения только для JPEG, PNG, GIF и WEBP.
+EXTENSIONS.setdefault('AVIF', 'avif')
+
+# Все размеры миниатюр, которые выводят шаблоны.
+THUMBNAIL_SIZES = _card_sizes(FORMATS)
+DEFAULT_SIZE = f'card-{CARD_WIDTHS[-1]}'
+
+
+def _source(image):
+    """
+    Исходная картинка для sorl. Хранилище указывается явно: от него
+    зависит ключ миниатюры, и он должен совпадать при создании
+    миниатюры по имени файла и при поиске по полю поста.
+    """
+    name = getattr(image, 'name', image)
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def _thumbnail_file(image, geometry, options):
+    """
+    Файл миниатюры, который получил бы sorl для этих параметров.
+    Повторяет подготовку опций из get_thumbnail, но ничего не создает
+    и не открывает исходную картинку.
+    """
+    backend = default.backend
+    source = _source(image)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def thumbnail_url(image, size=DEFAULT_SIZE):
+    """
+    Адрес готовой миниатюры или None, если она еще не создана.
+    Только читает хранилище sorl и никогда не ресайзит картинку
+    в потоке запроса.
+    """
+    if not image:
+        return None
+    geometry, options = THUMBNAIL_SIZES[size]
+    thumbnail = default.kvstore.get(_thumbnail_file(image, geometry, options))
+    return thumbnail.url if thumbnail else None
+
+
+def thumbnails_ready(image):
+    """Готовы ли все миниатюры картинки (пустая картинка готова)."""
+    return not image or all(
+        thumbnail_url(image, size) is not None for size in THUMBNAIL_SIZES
+    )
+
+
+def post_thumbnail_url(post, size=DEFAULT_SIZE):
+    """Адрес миниатюры поста: из prefetch_thumbnails или поиском."""
+    prefetched = getattr(post, '_thumbnails', None)
+    if prefetched is not None:
+        return prefetched.get(size)
+    return thumbnail_url(post.image, size)
+
+
+def post_thumbnails_ready(post):
+    return not post.image or all(
+        post_thumbnail_url(post, size) is not None
+        for size in THUMBNAIL_SIZES
+    )
+
+
+def _srcset(post, suffix=''):
+    return ', '.join(
+        f'{post_thumbnail_url(post, f"card-{width}{suffix}")} {width}w'
+        for width in CARD_WIDTHS
+    )
+
+
+def post_picture(post):
+    """
+    Данные для <picture> карточки поста: адрес по умолчанию, srcset
+    в исходном формате и источники в WebP/AVIF. None, пока хотя бы
+    одна миниатюра не готова.
+    """
+    if not post_thumbnails_ready(post):
+        return None
+    return {
+        'src': post_thumbnail_url(post),
+        'srcset': _srcset(post),
+        'sizes': CARD_SIZES,
+        'sources': [
+            {
+                'type': f'image/{fmt.lower()}',
+                'srcset': _srcset(post, f'-{fmt.lower()}'),
+            }
+            for fmt in FORMATS
+        ],
+    }
+
+
+def _load_raw(keys):
+    """
+    Сырые значения хранилища sorl для набора ключей: один get_many
+    по кэшу и один запрос к базе для промахов. Как и сам sorl,
+    отсутствие записи кэшируется, чтобы не спрашивать базу снова.
+    """
+    kvstore = default.kvstore
+    found = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        loaded = dict(
+            KVStoreModel.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        loaded.update(
+            (key, EMPTY_VALUE) for key in missing if key not in loaded
+        )
+        kvstore.cache.set_many(loaded, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        found.update(loaded)
+    return {
+        key: value for key, value in found.items() if value != EMPTY_VALUE
+    }
+
+
+def prefetch_thumbnails(posts):
+    """
+    Находит миниатюры всех размеров для страницы постов разом
+    и раскладывает адреса по постам (post._thumbnails), чтобы
+    шаблон не обращался к хранилищу sorl на каждую картинку.
+    """
+    posts = [post for post in posts if post.image]
+    if not posts:
+        return
+    if not isinstance(default.kvstore, CachedDBKVStore):
+        for post in posts:
+            post._thumbnails = {
+                size: thumbnail_url(post.image, size)
+                for size in THUMBNAIL_SIZES
+            }
+        return
+    wanted = {}
+    for post in posts:
+        for size, (geometry, options) in THUMBNAIL_SIZES.items():
+            thumbnail = _thumbnail_file(post.image, geometry, options)
+            wanted[post, size] = add_prefix(thumbnail.key)
+    raw = _load_raw(list(set(wanted.values())))
+    for post in posts:
+        post._thumbnails = {}
+    for (post, size), key in wanted.items():
+        value = raw.get(key)
+        post._thumbnails[size] = (
+            deserialize_image_file(value).url if value else None
+        )
+
+
+def generate_thumbnails(name):
+    """
+    Создает миниатюры всех размеров для картинки name
+    и возвращает их ключи.
+    """
+    keys = []
+    for geometry, options in THUMBNAIL_SIZES.values():
+        keys.append(
+            get_thumbnail(_source(name), geometry, **options).key
+        )
+    return keys
+
+
+def thumbnails_generated(keys):
+    """
+    Миниатюры готовы: забываем закэшированные промахи sorl
+    и сбрасываем кэш страниц, где вместо картинки стояла заглушка.
+    """
+    default.kvstore.cache.delete_many([add_prefix(key) for key in keys])
+    bump_generation()
+
+
+@task
+def make_thumbnails(name):
+    thumbnails_generated(generate_thumbnails(name))
+
+
+def schedule_thumbnails(post):
+    """
+    Ставит в очередь создание миниатюр картинки поста. Имя файла -
+    хеш содержимого, поэтому повторная загрузка той же картинки,
+    пока миниатюры еще в очереди, не создает вторую задачу.
+    """
+    if post.image:
+        name = post.image.name
+        make_thumbnails.enqueue(name, key=f'thumbnails:{name}')
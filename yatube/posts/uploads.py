@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    """
+    Считает байты загружаемого файла по мере получения и бросает файл,
+    как только он превысил MAX_UPLOAD_SIZE, не дожидаясь конца загрузки.
+    Поле отброшенного файла запоминается в request.rejected_uploads,
+    чтобы форма показала понятную ошибку. Сами данные передаются
+    дальше обычным обработчикам Django.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.MAX_UPLOAD_SIZE:
+            if not hasattr(self.request, 'rejected_uploads'):
+                self.request.rejected_uploads = set()
+            self.request.rejected_uploads.add(self.field_name)
+            raise SkipFile
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
@@ -1,15 +1,175 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
+
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils import timezone
 
 # Константа обозначает количество постов в выборке.
 NUMBER_OF_POSTS = 10
 
+# Дальше этой страницы поиск не листается: OFFSET растет
+# с номером страницы, а огромный номер не помещается в INTEGER.
+MAX_SEARCH_PAGE = 100
+
+# Количество комментариев, которые подгружаются за раз.
+NUMBER_OF_COMMENTS = 20
+
+# Ключ сортировки по умолчанию: от новых постов к старым.
+DEFAULT_KEYS = ('pub_date', 'id')
+
+# Направления обхода, которые кодируются в курсоре.
+NEXT = 'n'
+PREVIOUS = 'p'
+
+# Целые в курсоре должны помещаться в INTEGER базы (64 бита).
+MAX_INTEGER = 2 ** 63 - 1
+
+
+class CursorPaginator(Paginator):
+    """
+    Постраничный вывод по курсору (keyset). Страница выбирается
+    условием по ключу сортировки (pub_date, id) от последней
+    показанной записи, поэтому нет ни COUNT(*), ни OFFSET,
+    и любая страница стоит столько же, сколько первая.
+    Номер страницы и их количество не известны: paginator
+    хранит только соседей текущей страницы.
+    """
+
+    def __init__(self, object_list, per_page, keys=DEFAULT_KEYS):
+        super().__init__(object_list, per_page)
+        self.keys = keys
+        self.has_next = False
+        self.has_previous = False
+
+    @property
+    def number(self):
+        return 2 if self.has_previous else 1
+
+    @property
+    def num_pages(self):
+        return self.number + 1 if self.has_next else self.number
+
+    @property
+    def last_cursor(self):
+        """Курсор последней страницы: обход с конца выборки."""
+        return self.encode_cursor(PREVIOUS, ())
+
+    def encode_cursor(self, direction, values):
+        """Упаковывает направление и значения ключа в строку для URL."""
+        # isoformat() сохраняет микросекунды, иначе курсор
+        # пропустит посты, созданные в одну миллисекунду.
+        raw = json.dumps(
+            [direction, *values], default=lambda value: value.isoformat()
+        )
+        token = base64.urlsafe_b64encode(raw.encode())
+        return token.decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """
+        Разбирает курсор из URL. Испорченный курсор
+        ведет на первую страницу, как и отсутствующий.
+        """
+        if not cursor:
+            return NEXT, None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, *values = json.loads(raw.decode())
+        except (binascii.Error, ValueError, TypeError):
+            return NEXT, None
+        if direction not in (NEXT, PREVIOUS):
+            return NEXT, None
+        if not values:
+            return direction, None
+        if len(values) != len(self.keys):
+            return NEXT, None
+        try:
+            return direction, [
+                self._coerce(key, value)
+                for key, value in zip(self.keys, values)
+            ]
+        except (ValidationError, ValueError, TypeError):
+            return NEXT, None
+
+    def _field(self, key):
+        """Поле модели или аннотации, по которому идет сортировка."""
+        query = self.object_list.query
+        if key in query.annotations:
+            return query.annotations[key].output_field
+        opts = self.object_list.model._meta
+        return opts.pk if key == 'pk' else opts.get_field(key)
+
+    def _coerce(self, key, value):
+        """
+        Приводит значение из курсора к типу поля ключа. Подделанный
+        курсор дает ValidationError, ValueError или TypeError,
+        а не ошибку базы при фильтрации.
+        """
+        if value is None or isinstance(value, (list, dict)):
+            raise TypeError(value)
+        value = self._field(key).to_python(value)
+        if isinstance(value, datetime) and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        if isinstance(value, int) and abs(value) > MAX_INTEGER:
+            raise ValueError(value)
+        return value
+
+    def _seek(self, direction, values):
+        """
+        Условие «строго после курсора» для составного ключа:
+        (a < x) OR (a = x AND b < y) для обхода вперед.
+        """
+        lookup = 'lt' if direction == NEXT else 'gt'
+        condition = Q()
+        for position, key in enumerate(self.keys):
+            step = Q(**{f'{key}__{lookup}': values[position]})
+            for previous, value in zip(self.keys[:position], values):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def _key(self, obj):
+        return [getattr(obj, key) for key in self.keys]
+
+    def page(self, cursor=None):
+        direction, values = self.decode_cursor(cursor)
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._seek(direction, values))
+        if direction == NEXT:
+            ordering = [f'-{key}' for key in self.keys]
+        else:
+            ordering = list(self.keys)
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == NEXT:
+            self.has_next = has_more
+            self.has_previous = values is not None
+        else:
+            rows.reverse()
+            self.has_next = values is not None
+            self.has_previous = has_more
+        page = Page(rows, self.number, self)
+        page.next_cursor = (
+            self.encode_cursor(NEXT, self._key(rows[-1])) if rows else None
+        )
+        page.previous_cursor = (
+            self.encode_cursor(PREVIOUS, self._key(rows[0])) if rows else None
+        )
+        return page
+
 
-def get_paginator(request, posts):
+def get_paginator(request, posts, keys=DEFAULT_KEYS,
+                  per_page=NUMBER_OF_POSTS):
     """
     Добавим дополнительную функцию, которая
     разделит посты между страницами.
-    По 10 постов на каждую.
+    По 10 постов на каждую, страница задается курсором.
     """
-    paginator = Paginator(posts, NUMBER_OF_POSTS)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    paginator = CursorPaginator(posts, per_page, keys)
+    return paginator.page(request.GET.get('cursor'))
@@ -1,15 +1,26 @@
+from django.db.models import F
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
 from .models import Follow, Group, Post, User
 from .forms import CommentForm, PostForm
 from django.contrib.auth.decorators import login_required
-from posts.utils import get_paginator
-from django.views.decorators.cache import cache_page
+from posts.feed import request_feed_generation
+from posts.fragments import prefetch_fragments
+from posts.search import search_posts
+from posts.thumbnails import schedule_thumbnails
+from posts.utils import (
+    MAX_SEARCH_PAGE, NUMBER_OF_COMMENTS, NUMBER_OF_POSTS, get_paginator
+)
+from core.cache import (
+    PAGES_GENERATION, donut_cache_page, generation_condition
+)
 
+# Страницы хранятся долго: кэш сбрасывается сигналами при изменениях.
+CACHE_TIMEOUT = 60 * 60 * 6
 
-CACHE_TiMEOUT = 20
 
-
-@cache_page(CACHE_TiMEOUT, key_prefix="index_page")
+@generation_condition()
+@donut_cache_page(CACHE_TIMEOUT, key_prefix="index_page")
 def index(request):
     """
     Отображение главной страницы блога. Переменная "Post"
@@ -18,6 +29,7 @@ def index(request):
     """
     posts = Post.objects.select_related('author', 'group')
     page_obj = get_paginator(request, posts)
+    prefetch_fragments(page_obj)
     context = {
         'posts': posts,
         'page_obj': page_obj
@@ -25,6 +37,8 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@generation_condition()
+@donut_cache_page(CACHE_TIMEOUT, key_prefix="group_page")
 def group_posts(request, slug):
     """
     Отображение всех записей выбранной группы. Переменная "Post"
@@ -34,6 +48,7 @@ def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author')
     page_obj = get_paginator(request, posts)
+    prefetch_fragments(page_obj)
     context = {
         'group': group,
         'page_obj': page_obj
@@ -41,31 +56,42 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context, slug)
 
 
+@generation_condition(PAGES_GENERATION, request_feed_generation)
+@donut_cache_page(CACHE_TIMEOUT, key_prefix="profile_page")
 def profile(request, username):
     """
     Отображение записей конкретного автора.
     Так же показывает количество записей этого автора.
     Выведем на страницу по 10 записей.
     """
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username
+    )
+    posts = author.posts.select_related('group')
     page_obj = get_paginator(request, posts)
-    following = author.following.exists()
+    prefetch_fragments(page_obj)
     context = {
-        'following': following,
         'author': author,
         'page_obj': page_obj,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@generation_condition()
 def post_detail(request, post_id):
     """
     Выводит подробную информацию о выбранном посте.
+    Комментарии выводятся порциями, от новых к старым.
     """
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__profile', 'group'), id=post_id
+    )
     form = CommentForm()
-    comments = post.comments.all()
+    comments = get_paginator(
+        request,
+        post.comments.select_related('author'),
+        per_page=NUMBER_OF_COMMENTS,
+    )
     context = {
         'post': post,
         'form': form,
@@ -74,6 +100,56 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_search(request):
+    """
+    Поиск по тексту постов. Результаты упорядочены
+    по релевантности, по 10 записей на страницу.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        page_number = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page_number = 1
+    if page_number > MAX_SEARCH_PAGE:
+        raise Http404('Слишком далекая страница поиска')
+    posts = search_posts(
+        query,
+        NUMBER_OF_POSTS + 1,
+        (page_number - 1) * NUMBER_OF_POSTS,
+    )
+    if not posts and page_number > 1:
+        raise Http404('Страница поиска за последней')
+    has_next = len(posts) > NUMBER_OF_POSTS
+    posts = posts[:NUMBER_OF_POSTS]
+    prefetch_fragments(posts)
+    context = {
+        'query': query,
+        'posts': posts,
+        'page_number': page_number,
+        'has_next': has_next,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@generation_condition()
+def post_comments(request, post_id):
+    """
+    Следующая порция комментариев поста в виде фрагмента
+    разметки для подгрузки на странице поста.
+    """
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    comments = get_paginator(
+        request,
+        post.comments.select_related('author'),
+        per_page=NUMBER_OF_COMMENTS,
+    )
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    return render(request, 'includes/comments_list.html', context)
+
+
 @login_required
 def post_create(request):
     """
@@ -82,7 +158,8 @@ def post_create(request):
     """
     form = PostForm(
         request.POST or None,
-        files=request.FILES or None
+        files=request.FILES or None,
+        rejected_files=getattr(request, 'rejected_uploads', ()),
     )
     context = {
         'form': form
@@ -92,6 +169,7 @@ def post_create(request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            schedule_thumbnails(post)
             return redirect('posts:profile', username=request.user)
         return render(request, 'posts/create_post.html', context)
     return render(request, 'posts/create_post.html', context)
@@ -110,10 +188,13 @@ def post_edit(request, post_id):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        rejected_files=getattr(request, 'rejected_uploads', ()),
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            schedule_thumbnails(post)
         return redirect("posts:post_detail", post_id)
     context = {
         'form': form,
@@ -139,10 +220,22 @@ def add_comment(request, post_id):
 
 
 @login_required
+@generation_condition(PAGES_GENERATION, request_feed_generation)
 def follow_index(request):
-    """Страница с лентой пользователя."""
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_paginator(request, posts)
+    """
+    Страница с лентой пользователя. Посты читаются из материализованной
+    ленты FeedEntry, без соединения с подписками.
+    """
+    posts = Post.objects.filter(
+        feed_entries__user=request.user
+    ).select_related('author', 'group').annotate(
+        feed_pub_date=F('feed_entries__pub_date'),
+        feed_post_id=F('feed_entries__post_id'),
+    )
+    page_obj = get_paginator(
+        request, posts, keys=('feed_pub_date', 'feed_post_id')
+    )
+    prefetch_fragments(page_obj)
     context = {
         'title': "Избранные посты",
         'page_obj': page_obj
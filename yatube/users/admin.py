@@ -0,0 +1,11 @@
+from django.contrib import admin
+from .models import OutboxMessage
+
+
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'subject', 'to', 'created', 'sent_at', 'attempts')
+    list_filter = ('sent_at',)
+    search_fields = ('subject', 'to')
+
+
+admin.site.register(OutboxMessage, OutboxMessageAdmin)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.outbox import send_outbox
+
+
+class Command(BaseCommand):
+    help = 'Отправляет накопившиеся письма из очереди исходящих.'
+
+    def handle(self, *args, **options):
+        sent = send_outbox()
+        self.stdout.write(self.style.SUCCESS(f'Отправлено писем: {sent}.'))
@@ -0,0 +1,64 @@
+from django.db import models
+
+
+class OutboxMessage(models.Model):
+    """
+    Письмо, ожидающее отправки. Письма копятся в таблице и уходят
+    пачками через одно соединение с почтовым сервером (users.outbox).
+    """
+    subject = models.CharField(
+        max_length=255,
+        verbose_name='Тема'
+    )
+    body = models.TextField(
+        verbose_name='Текст'
+    )
+    html_body = models.TextField(
+        blank=True,
+        verbose_name='HTML'
+    )
+    from_email = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='Отправитель'
+    )
+    to = models.TextField(
+        verbose_name='Получатели',
+        help_text='Адреса через запятую'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создано'
+    )
+    claimed_by = models.CharField(
+        max_length=32,
+        blank=True,
+        verbose_name='Отправляется пачкой'
+    )
+    claimed_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Взято в отправку'
+    )
+    sent_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        db_index=True,
+        verbose_name='Отправлено'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка'
+    )
+
+    class Meta:
+        ordering = ('created',)
+        verbose_name = 'Письмо'
+        verbose_name_plural = 'Исходящие письма'
+
+    def __str__(self):
+        return f'{self.subject} → {self.to}'
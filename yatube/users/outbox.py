@@ -0,0 +1,108 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.tasks import task
+
+from .models import OutboxMessage
+
+# Сколько писем отправляется за один проход через одно соединение.
+OUTBOX_BATCH_SIZE = 100
+
+
+def queue_mail(subject, body, to, html_body='', from_email=None):
+    """
+    Кладет письмо в очередь исходящих и ставит задачу отправки.
+    Запрос не ждет почтового сервера.
+    """
+    OutboxMessage.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=','.join(to),
+    )
+    send_outbox.enqueue()
+
+
+def _claim_batch(token, skipped=()):
+    """
+    Помечает пачку неотправленных писем токеном, чтобы два воркера
+    не отправили одно письмо дважды. Пачки упавших воркеров
+    снова становятся доступны через TASKS_LOCK_TIMEOUT. Письма,
+    исчерпавшие OUTBOX_MAX_ATTEMPTS попыток, и письма skipped,
+    не ушедшие в этом проходе, не берутся.
+    """
+    expired = timezone.now() - timedelta(seconds=settings.TASKS_LOCK_TIMEOUT)
+    free = Q(claimed_by='') | Q(claimed_at__lt=expired)
+    ids = OutboxMessage.objects.filter(
+        free,
+        sent_at__isnull=True,
+        attempts__lt=settings.OUTBOX_MAX_ATTEMPTS,
+    ).exclude(pk__in=skipped).values_list('id', flat=True)[
+        :OUTBOX_BATCH_SIZE
+    ]
+    OutboxMessage.objects.filter(free, pk__in=list(ids)).update(
+        claimed_by=token, claimed_at=timezone.now()
+    )
+    return list(OutboxMessage.objects.filter(claimed_by=token))
+
+
+def _build(message, connection):
+    email = EmailMultiAlternatives(
+        message.subject,
+        message.body,
+        message.from_email or None,
+        message.to.split(','),
+        connection=connection,
+    )
+    if message.html_body:
+        email.attach_alternative(message.html_body, 'text/html')
+    return email
+
+
+@task
+def send_outbox():
+    """
+    Отправляет все накопившиеся письма через одно соединение,
+    каждое отдельно: отправленное письмо сразу помечается, а письмо
+    с ошибкой возвращается в очередь и не мешает остальным. Если
+    что-то не ушло, задача падает и повторяется с паузой (core.tasks).
+    """
+    sent = 0
+    failed = set()
+    error = None
+    connection = get_connection()
+    connection.open()
+    try:
+        while True:
+            token = uuid.uuid4().hex
+            batch = _claim_batch(token, failed)
+            if not batch:
+                break
+            for message in batch:
+                try:
+                    connection.send_messages([_build(message, connection)])
+                except Exception as exc:
+                    error = exc
+                    failed.add(message.pk)
+                    OutboxMessage.objects.filter(pk=message.pk).update(
+                        claimed_by='',
+                        claimed_at=None,
+                        attempts=F('attempts') + 1,
+                        last_error=repr(exc),
+                    )
+                    continue
+                OutboxMessage.objects.filter(pk=message.pk).update(
+                    sent_at=timezone.now(), claimed_by='', claimed_at=None
+                )
+                sent += 1
+    finally:
+        connection.close()
+    if error is not None:
+        raise error
+    return sent
@@ -0,0 +1,94 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.tasks import run_pending
+from users.models import OutboxMessage
+from users.outbox import queue_mail, send_outbox
+
+User = get_user_model()
+
+
+@override_settings(
+    TASKS_EAGER=False,
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class OutboxTest(TestCase):
+    def test_password_reset_mail_is_queued(self):
+        """Письмо сброса пароля уходит воркером, а не в запросе."""
+        User.objects.create_user('reader', 'reader@example.com', 'secret')
+        response = self.client.post(
+            reverse('users:password_reset'), {'email': 'reader@example.com'}
+        )
+        self.assertRedirects(response, reverse('users:password_reset_done'))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxMessage.objects.get().to, 'reader@example.com')
+
+        run_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('/auth/reset/', mail.outbox[0].body)
+        self.assertIsNotNone(OutboxMessage.objects.get().sent_at)
+
+    def test_batch_uses_one_connection(self):
+        """Все письма пачки отправляются через одно соединение."""
+        for number in range(3):
+            queue_mail(f'Письмо {number}', 'Текст', ['to@example.com'])
+        with mock.patch(
+            'users.outbox.get_connection', wraps=mail.get_connection
+        ) as get_connection:
+            self.assertEqual(send_outbox(), 3)
+        get_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(send_outbox(), 0)
+
+    def test_failed_message_returns_to_queue(self):
+        queue_mail('Тема', 'Текст', ['to@example.com'])
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages',
+            side_effect=ConnectionError('нет связи'),
+        ):
+            with self.assertRaises(ConnectionError):
+                send_outbox()
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.claimed_by, message.attempts), ('', 1))
+        self.assertIsNone(message.sent_at)
+        self.assertEqual(send_outbox(), 1)
+
+    def test_failed_message_does_not_block_others(self):
+        """
+        Письмо с ошибкой не мешает остальным, а уже отправленные
+        письма при повторе не уходят второй раз.
+        """
+        for number in range(3):
+            queue_mail(f'Письмо {number}', 'Текст', ['to@example.com'])
+        send_messages = EmailBackend.send_messages
+
+        def flaky(backend, messages):
+            if messages[0].subject == 'Письмо 1':
+                raise ConnectionError('нет связи')
+            return send_messages(backend, messages)
+
+        with mock.patch.object(
+            EmailBackend, 'send_messages', autospec=True, side_effect=flaky
+        ):
+            for _ in range(2):
+                with self.assertRaises(ConnectionError):
+                    send_outbox()
+        self.assertEqual(
+            [message.subject for message in mail.outbox],
+            ['Письмо 0', 'Письмо 2'],
+        )
+        failed = OutboxMessage.objects.get(sent_at__isnull=True)
+        self.assertEqual((failed.subject, failed.attempts), ('Письмо 1', 2))
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_exhausted_message_is_not_retried(self):
+        """Письмо, исчерпавшее попытки, больше не отправляется."""
+        queue_mail('Тема', 'Текст', ['to@example.com'])
+        OutboxMessage.objects.update(attempts=2)
+        self.assertEqual(send_outbox(), 0)
+        self.assertEqual(len(mail.outbox), 0)
@@ -10,6 +10,7 @@ from django.contrib.auth.views import (
 )
 from django.urls import path
 from . import views
+from .forms import OutboxPasswordResetForm
 
 app_name = 'users'
 
@@ -44,8 +45,10 @@ urlpatterns = [
     path(
         'password_reset/',
         # Форма изменения пароля через email.
-        PasswordResetView
-        .as_view(template_name='users/password_reset_form.html'),
+        PasswordResetView.as_view(
+            template_name='users/password_reset_form.html',
+            form_class=OutboxPasswordResetForm,
+        ),
         name='password_reset'
     ),
     path(
@@ -2,16 +2,6 @@ from django.views.generic import CreateView
 from django.urls import reverse_lazy
 from .forms import CreationForm
 
-from django.core.mail import send_mail
-
-send_mail(
-    'Тема письма',
-    'Текст письма.',
-    'from@example.com',
-    ['to@example.com'],
-    fail_silently=False,
-)
-
 
 class SignUp(CreateView):
     """
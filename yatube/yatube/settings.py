@@ -53,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,7 +72,8 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.MeteredDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -144,12 +146,26 @@ USE_TZ = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Отдачу медиа можно передать веб-серверу: префикс internal-локации
+# nginx для X-Accel-Redirect или X-Sendfile для Apache/lighttpd.
+MEDIA_ACCEL_REDIRECT = None
+MEDIA_SENDFILE = False
+
 STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static')
 ]
 
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# В продакшене collectstatic пишет имена с хешем и сжатые копии
+# .gz/.br; при DEBUG статика отдается как есть, без манифеста.
+if not DEBUG:
+    STATICFILES_STORAGE = (
+        'core.staticfiles.CompressedManifestStaticFilesStorage'
+    )
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
@@ -159,8 +175,67 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Ограничения загрузки: файл больше MAX_UPLOAD_SIZE отбрасывается
+# еще во время загрузки, картинка больше POST_IMAGE_MAX_PIXELS
+# не принимается, а длинная сторона уменьшается до POST_IMAGE_MAX_SIDE.
+MAX_UPLOAD_SIZE = 10 * 2 ** 20
+POST_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+POST_IMAGE_MAX_SIDE = 2560
+
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.LimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Фоновые задачи (core.tasks). При TASKS_EAGER они выполняются сразу
+# в запросе, иначе их выполняет manage.py run_worker. Воркер - отдельный
+# процесс, поэтому без TASKS_EAGER кэш должен быть общим (не LocMem).
+TASKS_EAGER = DEBUG
+TASKS_CONCURRENCY = 2
+TASKS_MAX_ATTEMPTS = 5
+TASKS_RETRY_DELAY = 10
+TASKS_LOCK_TIMEOUT = 60 * 5
+TASKS_POLL_INTERVAL = 1
+# Сколько хранить выполненные и упавшие задачи (manage.py prune_jobs).
+TASKS_FINISHED_TTL = 60 * 60 * 24 * 7
+# После стольких неудачных попыток письмо остается в таблице
+# неотправленным (users.outbox) и больше не отправляется.
+OUTBOX_MAX_ATTEMPTS = 5
+
+# В кэше лежат страницы, карточка на каждый пост и ключи миниатюр
+# sorl-thumbnail, поэтому стандартных 300 записей мало: кэш бы
+# постоянно вычищал сам себя. У FileBased add() не атомарен между
+# процессами, поэтому блокировка пересчета (core.cache.get_or_compute)
+# и выборки sorl-thumbnail с ним только снижают число одновременных
+# пересчетов, но не исключают их. Для нескольких процессов нужен общий
+# кэш с атомарным add() - memcached или redis.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.metrics.MeteredLocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
     }
 }
+if not TASKS_EAGER:
+    CACHES['default'] = {
+        'BACKEND': 'core.metrics.MeteredFileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    }
+
+# Метрики для Prometheus (core.metrics) на /metrics. По умолчанию
+# выключены. Включенные отдаются только адресам METRICS_ALLOWED_IPS,
+# а если задан METRICS_TOKEN - только с заголовком
+# «Authorization: Bearer <токен>». За обратным прокси на той же машине
+# (nginx) REMOTE_ADDR у всех запросов 127.0.0.1, поэтому одного списка
+# адресов мало: нужен токен. Счетчики свои у каждого процесса сервера.
+METRICS_ENABLED = False
+METRICS_ALLOWED_IPS = ['127.0.0.1']
+METRICS_TOKEN = None
+
+# Запросы к базе дольше SLOW_QUERY_MS миллисекунд пишутся в лог
+# core.querylog вместе с планом запроса (для SQLite). План одного
+# и того же запроса снимается не чаще раза в
+# SLOW_QUERY_EXPLAIN_INTERVAL секунд. None отключает журнал.
+SLOW_QUERY_MS = 100
+SLOW_QUERY_EXPLAIN_INTERVAL = 60